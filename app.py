@@ -1,11 +1,13 @@
-from flask import Flask, render_template, request, redirect, session, url_for, jsonify
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, request, redirect, session, url_for, jsonify, abort, Response, stream_with_context
+from flask_socketio import SocketIO, emit, join_room
 from flask_sqlalchemy import SQLAlchemy
 from game_logic import GameManager, Game
 from user_auth import UserManager
-from models import db, User, GameRecord
+from models import db, User, GameRecord, RecordSnapshot, GameStore, RecordWriter, upgrade_records, RECORDS_PER_PAGE
 from filter import FILTER_POOL
-import os, json, random
+from record_export import EXPORTERS
+import os, json, random, gzip, click
+from itertools import islice
 from functools import wraps
 
 app = Flask(__name__)
@@ -14,11 +16,15 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
 db.init_app(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-game_manager = GameManager()
 user_manager = UserManager(db)
 
 with app.app_context():
     db.create_all()
+    upgrade_records()
+
+# 溢出儲存與紀錄寫入都在背景執行緒，建立前資料表要先存在
+game_manager = GameManager(store=GameStore(app))
+record_writer = RecordWriter(app)
 
 @app.route("/")
 def index():
@@ -142,22 +148,85 @@ def partial(name):
     except:
         return "Not found", 404
 
+# 紀錄列表一律分頁：?before=<cursor> 取更舊的一頁
+def _page_args():
+    limit = min(max(request.args.get("limit", RECORDS_PER_PAGE, type=int), 1), 100)
+    before = request.args.get("before") or None
+    if before:
+        try:
+            GameRecord.parse_cursor(before)
+        except ValueError:
+            abort(400)
+    return before, limit
+
 @app.route("/records")
 def records():
-    records = GameRecord.query.order_by(GameRecord.created_at.desc()).all()
-    return render_template("records.html", records=records)
+    before, limit = _page_args()
+    records, next_cursor = GameRecord.page(before, limit, with_moves=True)
+    return render_template("records.html", records=records, next_cursor=next_cursor)
+
+@app.route("/api/records")
+def api_records():
+    before, limit = _page_args()
+    records, next_cursor = GameRecord.page(before, limit)
+    return jsonify({"records": [{"id": r.id, "created_at": r.created_at.isoformat()} for r in records],
+                    "next": next_cursor})
 
 @app.route("/view_record", methods=["GET"], endpoint="view_record_page")
 def view_record():
-    records = GameRecord.query.order_by(GameRecord.created_at.desc()).all()
-    record_id = request.args.get("record_id")
-    selected = None
-    moves = None
-    if record_id:
-        selected = GameRecord.query.get(record_id)
-        if selected:
-            moves = selected.moves
-    return render_template("view_record.html", records=records, selected=selected, moves=moves)
+    before, limit = _page_args()
+    records, next_cursor = GameRecord.page(before, limit)
+    record_id = request.args.get("record_id", type=int)
+    selected = db.session.get(GameRecord, record_id) if record_id else None
+    # 前端只需要總手數，盤面由 /api/records/<id>/position 逐手提供
+    total = selected.move_count() if selected else 0
+    return render_template("view_record.html", records=records, next_cursor=next_cursor,
+                           selected=selected, total=total)
+
+# 整張紀錄表串流匯出（?format=sgf|ndjson），邊讀邊送出 chunked 回應
+def _export_lines(fmt, chunk=500):
+    convert = EXPORTERS[fmt][0]
+    for r in GameRecord.stream(chunk):
+        yield convert(r.id, r.created_at, r.iter_moves())
+
+@app.route("/api/records/export")
+def export_records():
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORTERS:
+        abort(400)
+    return Response(stream_with_context(_export_lines(fmt)), mimetype=EXPORTERS[fmt][1],
+                    headers={"Content-Disposition": f"attachment; filename=records.{fmt}"})
+
+# flask --app app export-records --format sgf records.sgf.gz
+@app.cli.command("export-records")
+@click.argument("out")
+@click.option("--format", "fmt", type=click.Choice(list(EXPORTERS)), default="ndjson")
+@click.option("--chunk", default=500, help="每次從資料庫讀取的筆數")
+def export_records_command(out, fmt, chunk):
+    n = 0
+    with gzip.open(out, "wt", encoding="utf-8") as f:
+        for line in _export_lines(fmt, chunk):
+            f.write(line)
+            n += 1
+    click.echo(f"匯出 {n} 筆紀錄 → {out}")
+
+# 棋譜第 move 手下完後的盤面：從最近的快照接著重播，最多重播 SNAPSHOT_EVERY 手
+@app.route("/api/records/<int:record_id>/position")
+def record_position(record_id):
+    record = db.session.get(GameRecord, record_id)
+    if record is None:
+        return jsonify({"success": False, "message": "Record not found."}), 404
+    total = record.move_count()
+    k = min(max(request.args.get("move", total, type=int), 0), total)
+    snap = RecordSnapshot.nearest(record_id, k)
+    if snap is None:
+        game = Game.replay(islice(record.iter_moves(), k))
+    else:
+        # 棋譜分段編碼，iter_moves 直接從快照所在的段解起
+        game = Game.replay(islice(record.iter_moves(snap.move), k - snap.move),
+                           start=(snap.board, snap.turn))
+    return jsonify({"success": True, "move": k, "total": total,
+                    "board": game.board_rows(), "turn": game.turn})
 
 # @app.route("/")
 # def classic_game():
@@ -171,13 +240,18 @@ def classic_mode():
 def conv_mode():
     return render_template("conv_mode.html")
 
+# 每局對應一個以 game_id 命名的 Socket.IO 房間（對弈者與觀戰者）：
+# 成功的更新只送給該房間，失敗訊息只回給發送者
+def emit_to_game(event, game_id, result):
+    emit(event, result, room=game_id if result.get("success") else None)
+
 @socketio.on("place_stone")
 def handle_place_stone(data):
     game_id = data["game_id"]
     x, y = data["x"], data["y"]
     color = data["color"]
     result = game_manager.place_stone(game_id, x, y, color)
-    emit("update_board", result, broadcast=True)
+    emit_to_game("update_board", game_id, result)
 
 @socketio.on("conv_place_stone")
 def handle_cplace_stone(data):
@@ -185,22 +259,41 @@ def handle_cplace_stone(data):
     x, y = data["x"], data["y"]
     color = data["color"]
     result = game_manager.conv_place_stone(game_id, x, y, color)
-    emit("update_board", result, broadcast=True)
+    emit_to_game("update_board", game_id, result)
+
+# 批次落子：一次事件帶多顆子與落子方 color，只結算一次提子、只送出一次差異
+@socketio.on("conv_place_stones")
+def handle_cplace_stones(data):
+    game_id = data["game_id"]
+    stones = data.get("stones", [])
+    result = game_manager.conv_place_stones(game_id, stones, data.get("color"))
+    emit_to_game("update_board_batch", game_id, result)
 
 @socketio.on("new_game")
 def handle_new_game():
     game_id = game_manager.create_game()
+    join_room(game_id)
     emit("game_created", {"game_id": game_id})
 
+# 加入既有對局（對手或觀戰者），回傳目前盤面
+@socketio.on("join_game")
+def handle_join_game(data):
+    game_id = data.get("game_id")
+    game = game_manager.get_game(game_id)
+    if not game:
+        return emit("game_joined", {"success": False, "message": "Game not found."})
+    join_room(game_id)
+    emit("game_joined", {"success": True, "game_id": game_id,
+                         "board": game.board_rows(), "turn": game.turn})
+
 @socketio.on("reset_board")
 def handle_reset_board(data):
     game_id = data["game_id"]
     result = game_manager.reset_game(game_id)
+    snapshots = result.pop("snapshots", [])
     if result["success"]:
-        record = GameRecord(moves=json.dumps(result["moves"]))
-        db.session.add(record)
-        db.session.commit()
-    emit("board_reset", result, broadcast=True)
+        record_writer.submit(result["moves"], snapshots)
+    emit_to_game("board_reset", game_id, result)
 
 @app.route("/api/random_filters")
 def random_filters():
@@ -214,7 +307,14 @@ def handle_apply_convolution(data):
     turn = data.get("color")
     
     result = game_manager.apply_convolution(game_id, filter_name, turn)
-    emit("convolution_applied", result, broadcast=True)
+    emit_to_game("convolution_applied", game_id, result)
+
+# 通知同局其他人某張卷積卡已被使用
+@socketio.on("filter_used")
+def handle_filter_used(data):
+    game_id = data.get("game_id")
+    if game_manager.get_game(game_id):
+        emit("filter_used", {"filter_id": data.get("filter_id")}, room=game_id, include_self=False)
 
 # ----------------------  卡牌系統  ----------------------
 @app.route("/card")
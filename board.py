@@ -0,0 +1,389 @@
+# 棋盤引擎：以 union-find 增量維護棋串與氣，落子 / 提子不需每次 DFS
+# 盤面存成扁平 bytearray（0 空 / 1 黑 / 2 白），並增量維護 Zobrist hash
+import random
+
+BOARD_SIZE = 19
+EMPTY, BLACK, WHITE = 0, 1, 2
+
+
+def _build_neighbors(size):
+    table = []
+    for i in range(size * size):
+        x, y = i % size, i // size
+        nbrs = []
+        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < size and 0 <= ny < size:
+                nbrs.append(ny * size + nx)
+        table.append(tuple(nbrs))
+    return tuple(table)
+
+NEIGHBORS = _build_neighbors(BOARD_SIZE)
+
+# 固定種子：同一盤面在不同行程 / 重啟後得到相同 hash，可寫入資料庫比對
+_zrng = random.Random(0x60BA4D)
+ZOBRIST = tuple((0, _zrng.getrandbits(64), _zrng.getrandbits(64))
+                for _ in range(BOARD_SIZE * BOARD_SIZE))
+
+
+# 可 O(1) 增刪與隨機抽取的點集合（list + 位置索引，刪除時與最後一個交換）
+class PointSet:
+    def __init__(self, points=()):
+        self.items = list(points)
+        self.pos = {p: k for k, p in enumerate(self.items)}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, p):
+        return p in self.pos
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def add(self, p):
+        if p not in self.pos:
+            self.pos[p] = len(self.items)
+            self.items.append(p)
+
+    def discard(self, p):
+        k = self.pos.pop(p, None)
+        if k is None:
+            return
+        last = self.items.pop()
+        if k < len(self.items):
+            self.items[k] = last
+            self.pos[last] = k
+
+    def choice(self, rng):
+        return self.items[rng.randrange(len(self.items))]
+
+    def sample(self, rng, k):
+        return [self.items[j] for j in rng.sample(range(len(self.items)), k)]
+
+    def copy(self):
+        return PointSet(self.items)
+
+
+class Board:
+    def __init__(self, cells=None):
+        n = BOARD_SIZE * BOARD_SIZE
+        self.cells = bytearray(n)
+        self.parent = list(range(n))
+        self.stones = {}    # root -> 棋串所有點
+        self.libs = {}      # root -> 棋串的氣（空點集合）
+        self.hash = 0
+        # 空點與各色棋子的索引，隨機落子 / 隨機移除不必掃全盤
+        self.empty_points = PointSet(range(n))
+        self.stone_points = {BLACK: PointSet(), WHITE: PointSet()}
+        if cells is not None:
+            self.load(cells)
+
+    # -------------- 快照 / 序列化 --------------
+    def load(self, cells):
+        # 整盤改寫後一次重建棋串與 hash
+        self.cells[:] = bytes(cells)
+        self._rebuild()
+
+    def _rebuild(self):
+        cells, parent = self.cells, self.parent
+        self.stones, self.libs = {}, {}
+        parent[:] = range(len(cells))
+        self.empty_points = PointSet(i for i, c in enumerate(cells) if c == EMPTY)
+        self.stone_points = {color: PointSet(i for i, c in enumerate(cells) if c == color)
+                             for color in (BLACK, WHITE)}
+        h = 0
+        seen = bytearray(len(cells))
+        for i, color in enumerate(cells):
+            if color == EMPTY:
+                continue
+            h ^= ZOBRIST[i][color]
+            if seen[i]:
+                continue
+            seen[i] = 1
+            group, libs, stack = [i], set(), [i]
+            while stack:
+                s = stack.pop()
+                for n in NEIGHBORS[s]:
+                    c = cells[n]
+                    if c == EMPTY:
+                        libs.add(n)
+                    elif c == color and not seen[n]:
+                        seen[n] = 1
+                        parent[n] = i
+                        group.append(n)
+                        stack.append(n)
+            self.stones[i] = group
+            self.libs[i] = libs
+        self.hash = h
+
+    def snapshot(self):
+        return bytes(self.cells)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(v for row in rows for v in row)
+
+    def to_rows(self):
+        cells = self.cells
+        return [list(cells[y * BOARD_SIZE:(y + 1) * BOARD_SIZE]) for y in range(BOARD_SIZE)]
+
+    def copy(self):
+        other = Board.__new__(Board)
+        other.cells = bytearray(self.cells)
+        other.parent = self.parent.copy()
+        other.stones = {r: g.copy() for r, g in self.stones.items()}
+        other.libs = {r: l.copy() for r, l in self.libs.items()}
+        other.hash = self.hash
+        other.empty_points = self.empty_points.copy()
+        other.stone_points = {c: ps.copy() for c, ps in self.stone_points.items()}
+        return other
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self.hash == other.hash and self.cells == other.cells
+
+    __hash__ = None
+
+    # -------------- 座標 --------------
+    @staticmethod
+    def inside(x, y):
+        return 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE
+
+    @staticmethod
+    def index(x, y):
+        return y * BOARD_SIZE + x
+
+    @staticmethod
+    def point(i):
+        return i % BOARD_SIZE, i // BOARD_SIZE
+
+    def get(self, x, y):
+        return self.cells[y * BOARD_SIZE + x]
+
+    def random_stone(self, rng):
+        # 在所有棋子（不分顏色）中等機率抽一顆
+        black, white = self.stone_points[BLACK], self.stone_points[WHITE]
+        k = rng.randrange(len(black) + len(white))
+        return black.items[k] if k < len(black) else white.items[k - len(black)]
+
+    # -------------- union-find --------------
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _union(self, a, b):
+        if a == b:
+            return a
+        if len(self.stones[a]) < len(self.stones[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.stones[a].extend(self.stones.pop(b))
+        self.libs[a] |= self.libs.pop(b)
+        return a
+
+    # -------------- 查詢 --------------
+    def group_and_liberties(self, x, y):
+        i = y * BOARD_SIZE + x
+        if self.cells[i] == EMPTY:
+            return [], True
+        root = self.find(i)
+        return [self.point(s) for s in self.stones[root]], bool(self.libs[root])
+
+    def liberties(self, x, y):
+        i = y * BOARD_SIZE + x
+        if self.cells[i] == EMPTY:
+            return set()
+        return self.libs[self.find(i)]
+
+    def chain(self, root):
+        return [self.point(s) for s in self.stones[root]]
+
+    def dead_chains(self, points, color):
+        # 多顆子同時落下後，相鄰且已無氣的對方棋串 root（每串只看一次）
+        cells = self.cells
+        seen, dead = set(), []
+        for x, y in points:
+            for n in NEIGHBORS[y * BOARD_SIZE + x]:
+                c = cells[n]
+                if c == EMPTY or c == color:
+                    continue
+                r = self.find(n)
+                if r not in seen:
+                    seen.add(r)
+                    if not self.libs[r]:
+                        dead.append(r)
+        return dead
+
+    def chain_liberties(self, points):
+        # points 所屬棋串（去重）的氣的聯集；空集合代表整組都沒氣
+        cells = self.cells
+        roots = {self.find(y * BOARD_SIZE + x) for x, y in points
+                 if cells[y * BOARD_SIZE + x] != EMPTY}
+        return set().union(*(self.libs[r] for r in roots))
+
+    def would_capture(self, i, color):
+        # 在 i 落子後會被提的對方棋串 root
+        cells = self.cells
+        roots = []
+        for n in NEIGHBORS[i]:
+            c = cells[n]
+            if c != EMPTY and c != color:
+                r = self.find(n)
+                if r not in roots and self.libs[r] == {i}:
+                    roots.append(r)
+        return roots
+
+    def hash_after(self, i, color):
+        # 在 i 落子（含提子）後的盤面 hash，不實際改盤
+        h = self.hash ^ ZOBRIST[i][color]
+        cells = self.cells
+        for r in self.would_capture(i, color):
+            for s in self.stones[r]:
+                h ^= ZOBRIST[s][cells[s]]
+        return h
+
+    def is_suicide(self, i, color):
+        # i 必須為空點；不會提子且落子後己方棋串沒有氣即為自殺
+        cells = self.cells
+        for n in NEIGHBORS[i]:
+            c = cells[n]
+            if c == EMPTY:
+                return False
+            libs = self.libs[self.find(n)]
+            if c == color:
+                if len(libs) > 1:
+                    return False
+            elif libs == {i}:
+                return False
+        return True
+
+    # -------------- 修改 --------------
+    def _add(self, i, color):
+        cells = self.cells
+        cells[i] = color
+        self.hash ^= ZOBRIST[i][color]
+        self.empty_points.discard(i)
+        self.stone_points[color].add(i)
+        self.parent[i] = i
+        self.stones[i] = [i]
+        self.libs[i] = {n for n in NEIGHBORS[i] if cells[n] == EMPTY}
+        root = i
+        for n in NEIGHBORS[i]:
+            c = cells[n]
+            if c == EMPTY:
+                continue
+            r = self.find(n)
+            self.libs[r].discard(i)
+            if c == color:
+                root = self._union(root, r)
+        return root
+
+    def _release(self, root):
+        # 整串移除：釋放的點變成相鄰棋串的氣
+        cells, parent = self.cells, self.parent
+        stones = self.stones.pop(root)
+        del self.libs[root]
+        h = self.hash
+        empty, points = self.empty_points, self.stone_points[cells[root]]
+        for s in stones:
+            h ^= ZOBRIST[s][cells[s]]
+            cells[s] = EMPTY
+            parent[s] = s
+            points.discard(s)
+            empty.add(s)
+        self.hash = h
+        for s in stones:
+            for n in NEIGHBORS[s]:
+                if cells[n] != EMPTY:
+                    self.libs[self.find(n)].add(s)
+        return stones
+
+    def _remove(self, i):
+        # 移除單顆棋子：原棋串可能斷開，只重建這一串
+        cells, parent = self.cells, self.parent
+        color = cells[i]
+        root = self.find(i)
+        stones = self.stones.pop(root)
+        del self.libs[root]
+        self.hash ^= ZOBRIST[i][color]
+        cells[i] = EMPTY
+        self.stone_points[color].discard(i)
+        self.empty_points.add(i)
+        for s in stones:
+            parent[s] = s
+        rest = set(stones)
+        rest.discard(i)
+        while rest:
+            start = rest.pop()
+            group, libs, stack = [start], set(), [start]
+            while stack:
+                s = stack.pop()
+                for n in NEIGHBORS[s]:
+                    c = cells[n]
+                    if c == EMPTY:
+                        libs.add(n)
+                    elif c == color and n in rest:
+                        rest.discard(n)
+                        parent[n] = start
+                        group.append(n)
+                        stack.append(n)
+            self.stones[start] = group
+            self.libs[start] = libs
+        for n in NEIGHBORS[i]:
+            if cells[n] != EMPTY:
+                self.libs[self.find(n)].add(i)
+
+    def place(self, x, y, color):
+        # 落子並提掉沒有氣的對方棋串，回傳被提的座標
+        i = y * BOARD_SIZE + x
+        self._add(i, color)
+        captured = []
+        cells = self.cells
+        for n in NEIGHBORS[i]:
+            c = cells[n]
+            if c != EMPTY and c != color:
+                r = self.find(n)
+                if not self.libs[r]:
+                    captured.extend(self.point(s) for s in self._release(r))
+        return captured
+
+    def capture(self, root, keep=()):
+        # 提掉整串，keep 中的座標保留（例如受守護的棋子），回傳被提的座標
+        if not keep:
+            return [self.point(s) for s in self._release(root)]
+        points = [p for p in self.chain(root) if p not in keep]
+        self.remove_stones(points)
+        return points
+
+    def set(self, x, y, color):
+        # 直接改寫一格（不提子），供卡牌效果等任意改盤使用
+        i = y * BOARD_SIZE + x
+        if self.cells[i] == color:
+            return
+        if self.cells[i] != EMPTY:
+            self._remove(i)
+        if color != EMPTY:
+            self._add(i, color)
+
+    def remove_dead(self, color):
+        # 提掉某色所有沒有氣的棋串（整盤改寫後結算用），回傳被提的座標
+        cells, libs = self.cells, self.libs
+        dead = [r for r in self.stones if cells[r] == color and not libs[r]]
+        captured = []
+        for r in dead:
+            captured.extend(self.point(s) for s in self._release(r))
+        return captured
+
+    def remove(self, x, y):
+        i = y * BOARD_SIZE + x
+        if self.cells[i] != EMPTY:
+            self._remove(i)
+
+    def remove_stones(self, points):
+        for x, y in points:
+            self.remove(x, y)
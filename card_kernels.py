@@ -0,0 +1,156 @@
+# 卡牌效果的 NumPy 運算核心
+# 範圍型魔法卡（26 隕石、27 雷射、28 炸彈、36 多點移除、47 懷表）只負責產生
+# 「每格被命中幾次」的遮罩，守護判定與移除由 apply_area 一次處理
+import numpy as np
+from board import BOARD_SIZE, EMPTY
+
+SHAPE = (BOARD_SIZE, BOARD_SIZE)
+
+
+def board_array(board):
+    # 與 Board.cells 共用記憶體的 19x19 唯讀視圖（不複製）
+    return np.frombuffer(board.cells, dtype=np.uint8).reshape(SHAPE)
+
+
+def square(ax, ay, r=1):
+    hits = np.zeros(SHAPE, dtype=np.int16)
+    hits[max(0, ay - r):max(0, ay + r + 1), max(0, ax - r):max(0, ax + r + 1)] = 1
+    return hits
+
+
+def row(y):
+    hits = np.zeros(SHAPE, dtype=np.int16)
+    hits[y, :] = 1
+    return hits
+
+
+def col(x):
+    hits = np.zeros(SHAPE, dtype=np.int16)
+    hits[:, x] = 1
+    return hits
+
+
+def points(pts):
+    hits = np.zeros(SHAPE, dtype=np.int16)
+    if pts:
+        xs, ys = zip(*pts)
+        np.add.at(hits, (np.array(ys), np.array(xs)), 1)
+    return hits
+
+
+def apply_area(board, guard, hits, stones_only=False):
+    """依命中遮罩移除棋子，回傳被移除的座標（差異）。
+    守護（guard）逐次抵擋：被命中的守護點消耗一次守護，命中兩次以上才會被移除；
+    stones_only 為 True 時只有該格有棋子才會消耗守護（懷表的規則）"""
+    occupied = board_array(board) != 0
+    guarded = np.zeros(SHAPE, dtype=bool)
+    for x, y in guard:
+        guarded[y, x] = True
+    hit = hits > 0
+    consumed = hit & guarded
+    if stones_only:
+        consumed &= occupied
+    removed = occupied & (hits - guarded > 0)
+
+    for y, x in zip(*np.nonzero(consumed)):
+        del guard[(int(x), int(y))]
+    diff = [(int(x), int(y)) for y, x in zip(*np.nonzero(removed))]
+    board.remove_stones(diff)
+    return diff
+
+
+# ---------- 黑白棋翻轉（卡 29） ----------
+# RAYS[i, d] 為從 i 往第 d 個方向依序經過的格子索引，超出棋盤以 OFF 補齊；
+# 每條射線至少以一個 OFF 結尾，argmax 一定找得到停止點
+OFF = BOARD_SIZE * BOARD_SIZE
+RAY_DIRS = [(-1,0), (1,0), (0,-1), (0,1), (-1,-1), (1,1), (1,-1), (-1,1)]
+
+
+def _build_rays(size):
+    rays = np.full((size * size, len(RAY_DIRS), size), size * size, dtype=np.intp)
+    for i in range(size * size):
+        x0, y0 = i % size, i // size
+        for d, (dx, dy) in enumerate(RAY_DIRS):
+            x, y, k = x0 + dx, y0 + dy, 0
+            while 0 <= x < size and 0 <= y < size:
+                rays[i, d, k] = y * size + x
+                x, y, k = x + dx, y + dy, k + 1
+    return rays
+
+RAYS = _build_rays(BOARD_SIZE)
+_STEP = np.arange(BOARD_SIZE)
+
+
+def othello_flip(board, color, coords):
+    """依序以每顆新落的子做黑白棋夾擊翻轉，回傳被翻成 color 的座標"""
+    other = 3 - color
+    flipped = []
+    for x0, y0 in coords:
+        ext = np.append(board_array(board).ravel(), 255)
+        rays = RAYS[y0 * BOARD_SIZE + x0]
+        vals = ext[rays]
+        run = np.argmax(vals != other, axis=1)          # 連續對方棋子的長度
+        closed = (vals[np.arange(len(RAY_DIRS)), run] == color) & (run > 0)
+        idx = rays[closed[:, None] & (_STEP < run[:, None])]
+        for i in idx.tolist():
+            p = (i % BOARD_SIZE, i // BOARD_SIZE)
+            board.set(p[0], p[1], color)
+            flipped.append(p)
+    return flipped
+
+
+# ---------- 形狀牌合法落點 ----------
+DIRS4 = [(-1,0), (1,0), (0,-1), (0,1)]
+
+
+def rects(rs):
+    # 多個 ((x0,y0),(x1,y1)) 矩形（含端點）的聯集遮罩
+    mask = np.zeros(SHAPE, dtype=bool)
+    for (x0, y0), (x1, y1) in rs:
+        mask[y0:y1 + 1, x0:x1 + 1] = True
+    return mask
+
+
+def shift(mask, dx, dy):
+    # out[ay, ax] = mask[ay+dy, ax+dx]，超出棋盤為 False
+    n = BOARD_SIZE
+    out = np.zeros_like(mask)
+    out[max(0, -dy):n - max(0, dy), max(0, -dx):n - max(0, dx)] = \
+        mask[max(0, dy):n - max(0, -dy), max(0, dx):n - max(0, -dx)]
+    return out
+
+
+def _suicidal(board, guard, color, pts):
+    # 照 play_card 的順序實際模擬一次：落子、提子（守護保留）、看己方棋串有沒有氣
+    b = board.copy()
+    for x, y in pts:
+        b.set(x, y, color)
+    for r in b.dead_chains(pts, color):
+        b.capture(r, keep={p for p in b.chain(r) if p in guard})
+    return not b.chain_liberties(pts)
+
+
+def legal_anchors(board, color, vecs, forbidden, guard):
+    """形狀 vecs 的每個錨點能否落子：所有格子在盤內、為空、不在結界內，且不是自殺手。
+    足跡外還碰得到空點的錨點一定有氣；只有剩下的少數錨點才逐一模擬提子"""
+    empty = board_array(board) == EMPTY
+    free = empty & ~forbidden
+    ok = np.ones(SHAPE, dtype=bool)
+    for dx, dy in vecs:
+        ok &= shift(free, dx, dy)
+    foot = set(vecs)
+    breath = np.zeros(SHAPE, dtype=bool)
+    for dx, dy in vecs:
+        for nx, ny in DIRS4:
+            if (dx + nx, dy + ny) not in foot:
+                breath |= shift(empty, dx + nx, dy + ny)
+    for ay, ax in zip(*np.nonzero(ok & ~breath)):
+        pts = [(int(ax) + dx, int(ay) + dy) for dx, dy in vecs]
+        if _suicidal(board, guard, color, pts):
+            ok[ay, ax] = False
+    return ok
+
+
+def pack(mask):
+    # 361 格 → 位元組（第 i 格為 byte i//8 的第 i%8 位）→ hex 字串
+    return np.packbits(mask.ravel(), bitorder="little").tobytes().hex()
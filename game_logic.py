@@ -1,44 +1,65 @@
-import uuid
+import uuid, time
+import numpy as np
+from collections import OrderedDict
+from board import Board, BOARD_SIZE, EMPTY, BLACK, WHITE
+from filter import FILTER_POOL
+
+COLOR_CODE = {"black": BLACK, "white": WHITE}
+COLOR_NAME = {EMPTY: None, BLACK: "black", WHITE: "white"}
+FILTERS = {f["id"]: np.array(f["matrix"], dtype=float) for f in FILTER_POOL}
+SNAPSHOT_EVERY = 32   # 每幾手存一次盤面快照，棋譜跳到任一手最多只需重播這麼多手
+
+
+# 3x3 卷積（與前端 conv.js 相同：邊界補 0、黑 +1 白 -1、不翻轉 kernel），
+# 結果 >0 為黑、<0 為白、=0 為空
+def convolve_board(cells, kernel):
+    arr = np.frombuffer(cells, dtype=np.uint8).reshape(BOARD_SIZE, BOARD_SIZE)
+    signed = np.pad((arr == BLACK).astype(float) - (arr == WHITE), 1)
+    total = np.zeros((BOARD_SIZE, BOARD_SIZE))
+    for dy in range(3):
+        for dx in range(3):
+            if kernel[dy, dx]:
+                total += kernel[dy, dx] * signed[dy:dy + BOARD_SIZE, dx:dx + BOARD_SIZE]
+    out = np.where(total > 0, BLACK, np.where(total < 0, WHITE, EMPTY))
+    return out.astype(np.uint8).tobytes()
 
 class Game:
     def __init__(self):
-        self.board = [[None for _ in range(19)] for _ in range(19)]
+        self.board = Board()
         self.turn = "black"
         self.moves = []
+        self.snapshots = []   # [(手數, 盤面 bytes, 下一手顏色)]，每 SNAPSHOT_EVERY 手一筆
+        self.history = {self.board.hash}  # 出現過的盤面 hash（全域同形）
+
+    # 棋譜只會往後追加；每滿 SNAPSHOT_EVERY 手順便記下當時的盤面
+    def _record(self, entry):
+        self.moves.append(entry)
+        if len(self.moves) % SNAPSHOT_EVERY == 0:
+            self.snapshots.append((len(self.moves), self.board.snapshot(), self.turn))
 
     def place_stone(self, x, y, color):
         if not self.is_valid_move(x, y, color):
-            if self.board[y][x]:
+            if Board.inside(x, y) and self.board.get(x, y):
                 return {"x": x, "y": y, "color": color, "success": False, "message": "妳不能下在已有棋子的位子"}
             elif color != self.turn:
                 return {"x": x, "y": y, "color": color, "success": False, "message": "妳不能在對方回合落子"}
-            else:
+            elif not Board.inside(x, y):
                 return {"x": x, "y": y, "color": color, "success": False, "message": "妳不能下在邊界外"}
+            else:
+                return {"x": x, "y": y, "color": color, "success": False, "message": "妳不能重複之前出現過的盤面（劫）"}
 
-        self.board[y][x] = color
-        opponent = "white" if color == "black" else "black"
-        to_capture = []
-
-        # 檢查落子是否造成提子
-        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < 19 and 0 <= ny < 19 and self.board[ny][nx] == opponent:
-                group, has_liberty = self.get_group_and_liberties(nx, ny)
-                if not has_liberty:
-                    to_capture.extend(group)
+        # 檢查自己是否變成無氣（自殺）：不會提子且相鄰己方棋串只剩這口氣
+        if self.board.is_suicide(Board.index(x, y), COLOR_CODE[color]):
+            return {"x": x, "y": y, "color": color, "success": False, "message": "Suicide move."}
 
-        if to_capture:
-            self.remove_group(to_capture)
+        # 落子並提掉沒有氣的對方棋串
+        to_capture = self.board.place(x, y, COLOR_CODE[color])
+        opponent = "white" if color == "black" else "black"
+        self.history.add(self.board.hash)
 
-        # 檢查自己是否變成無氣（自殺）
-        group, has_liberty = self.get_group_and_liberties(x, y)
-        if not has_liberty:
-            self.board[y][x] = None
-            return {"x": x, "y": y, "color": color, "success": False, "message": "Suicide move."}
-        
         # 落子正常，紀錄
-        self.moves.append({"x": x, "y": y, "color": color}) 
         self.turn = opponent
+        self._record({"x": x, "y": y, "color": color})
         return {
             "x": x, "y": y, "color": color,
             "success": True,
@@ -47,123 +68,236 @@ class Game:
 
 
     def is_valid_move(self, x, y, color):
-        if 0 <= x < 19 and 0 <= y < 19:
-            if self.board[y][x] is None and color == self.turn:
-                return True
+        if Board.inside(x, y):
+            if not self.board.get(x, y) and color == self.turn:
+                return not self.is_superko(x, y, color)
         return False
+
+    # 劫 / 全域同形：落子後的盤面 hash 出現過即禁止，不需複製棋盤
+    def is_superko(self, x, y, color):
+        return self.board.hash_after(Board.index(x, y), COLOR_CODE[color]) in self.history
     
-    # 尋找連通區域並判斷有無'氣'
+    # 尋找連通區域並判斷有無'氣'（由棋盤引擎直接查詢，不再 DFS）
     def get_group_and_liberties(self, x, y):
-        color = self.board[y][x]
-        if color is None:
-            return [], True
-
-        visited = set()
-        group = []
-        has_liberty = False
-        stack = [(x, y)]
-
-        # dfs搜尋連通區塊
-        while stack:
-            cx, cy = stack.pop()
-            if (cx, cy) in visited:
-                continue
-            visited.add((cx, cy))
-            group.append((cx, cy))
-
-            for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-                nx, ny = cx + dx, cy + dy
-                if 0 <= nx < 19 and 0 <= ny < 19:
-                    neighbor = self.board[ny][nx]
-                    if neighbor is None:
-                        has_liberty = True
-                    elif neighbor == color and (nx, ny) not in visited:
-                        stack.append((nx, ny))
-
-        return group, has_liberty
+        return self.board.group_and_liberties(x, y)
 
     # 清除指定區域棋子
     def remove_group(self, group):
-        for x, y in group:
-            self.board[y][x] = None
+        self.board.remove_stones(group)
+
+
+    # 依棋譜（GameRecord.moves）重建對局；與即時對局共用同一個棋盤引擎，
+    # 重建後的 history 可直接用來檢查後續落子是否違反全域同形。
+    # 給 start=(盤面 bytes, 下一手顏色) 時從該快照接著重播（history 只從快照算起）
+    @classmethod
+    def replay(cls, moves, start=None):
+        game = cls()
+        if start is not None:
+            game.board.load(start[0])
+            game.turn = start[1]
+            game.history = {game.board.hash}
+        for mv in moves:
+            if mv.get("filter") is not None:
+                # 舊版的卷積紀錄沒有 turn：卷積結果已經由前面逐顆的 conv 落子寫進棋譜，
+                # 這筆只是標記，不能再卷積一次
+                if mv.get("turn") is not None:
+                    game.apply_convolution(mv["filter"], mv["turn"])
+            elif mv.get("stones") is not None:
+                # 較早的批次紀錄沒有 color，當時以最後一顆的顏色為落子方
+                game.conv_place_stones([{"x": x, "y": y, "color": c} for x, y, c in mv["stones"]],
+                                       mv.get("color") or mv["stones"][-1][2])
+            else:
+                game.conv_place_stone(mv["x"], mv["y"], mv["color"])
+        return game
+
+    # 序列化（閒置對局溢出到資料庫用）
+    def to_dict(self):
+        return {
+            "board": self.board.snapshot().hex(),
+            "turn": self.turn,
+            "moves": self.moves,
+            "snapshots": [[n, cells.hex(), turn] for n, cells, turn in self.snapshots],
+            "history": list(self.history)
+        }
 
+    @classmethod
+    def from_dict(cls, data):
+        game = cls()
+        game.board.load(bytes.fromhex(data["board"]))
+        game.turn = data["turn"]
+        game.moves = data["moves"]
+        game.snapshots = [(n, bytes.fromhex(cells), turn) for n, cells, turn in data.get("snapshots", [])]
+        game.history = set(data["history"])
+        return game
 
     def reset_board(self):
-        moves = self.moves.copy()
+        moves, snapshots = self.moves, self.snapshots
         self.__init__()
-        return {"success": True, "message": "Board reset.", "moves": moves}
+        return {"success": True, "message": "Board reset.", "moves": moves, "snapshots": snapshots}
     
+    def board_rows(self):
+        return [[COLOR_NAME[v] for v in row] for row in self.board.to_rows()]
+
+    # 卷積卡：整盤一次改寫後統一結算提子；turn 為下一手的顏色，
+    # 先提 turn 方（被施放方）沒有氣的棋串，再提施放方自己的
     def apply_convolution(self, filter_name="default", turn="black"):
-        moves = self.moves.copy()
-        self.__init__()
-        self.moves = moves
+        kernel = FILTERS.get(filter_name)
+        if kernel is None:
+            return {"success": False, "message": f"沒有這個 filter: {filter_name}"}
+        if turn not in COLOR_CODE:
+            return {"success": False, "message": f"不合法的顏色: {turn}"}
+
+        self.board.load(convolve_board(self.board.cells, kernel))
+        caster = "white" if turn == "black" else "black"
+        captures = self.board.remove_dead(COLOR_CODE[turn])
+        captures += self.board.remove_dead(COLOR_CODE[caster])
+        self.history.add(self.board.hash)
         self.turn = turn
         self.filter_used = filter_name
 
-        self.moves.append({"x": None, "y": None, "color": None, "filter": filter_name})
+        self._record({"x": None, "y": None, "color": None, "filter": filter_name, "turn": turn})
 
-        return {"success": True, "message": f"應用了 filter: {filter_name}"}
+        return {
+            "success": True,
+            "message": f"應用了 filter: {filter_name}",
+            "filter": filter_name,
+            "turn": turn,
+            "board": self.board_rows(),
+            "captures": captures
+        }
     #卷積特用落子函數，跳過合理性檢查
     def conv_place_stone(self, x, y, color):
-        self.board[y][x] = color
-        opponent = "white" if color == "black" else "black"
-        to_capture = []
-
-        # 檢查落子是否造成提子
-        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < 19 and 0 <= ny < 19 and self.board[ny][nx] == opponent:
-                group, has_liberty = self.get_group_and_liberties(nx, ny)
-                if not has_liberty:
-                    to_capture.extend(group)
+        # 盤面是扁平陣列，超出邊界的座標會落到別的格子上，必須先擋掉
+        if not (isinstance(x, int) and isinstance(y, int) and Board.inside(x, y)) or color not in COLOR_CODE:
+            return {"x": x, "y": y, "color": color, "success": False, "message": "不合法的落子"}
 
-        if to_capture:
-            self.remove_group(to_capture)
+        # 直接覆蓋原有棋子
+        self.board.remove(x, y)
+        opponent = "white" if color == "black" else "black"
 
         # 檢查自己是否變成無氣（自殺）
-        group, has_liberty = self.get_group_and_liberties(x, y)
-        if not has_liberty:
-            self.board[y][x] = None
+        if self.board.is_suicide(Board.index(x, y), COLOR_CODE[color]):
             return {"x": x, "y": y, "color": color, "success": False, "message": "Suicide move."}
+
+        # 檢查落子是否造成提子
+        to_capture = self.board.place(x, y, COLOR_CODE[color])
+        self.history.add(self.board.hash)
         
         # 落子正常，紀錄
-        self.moves.append({"x": x, "y": y, "color": color}) 
         self.turn = opponent
+        self._record({"x": x, "y": y, "color": color})
         return {
             "x": x, "y": y, "color": color,
             "success": True,
             "captures": to_capture  # 傳給前端清除
         }
 
+    # 卷積特用批次落子：全部寫入後只結算一次提子，回傳合併後的盤面差異
+    # color 為落子方（與各顆棋子的顏色無關），先提對方沒有氣的棋串，再提自己的
+    def conv_place_stones(self, stones, color):
+        if color not in COLOR_CODE:
+            return {"success": False, "message": f"不合法的顏色: {color}"}
+        placed = []
+        for st in stones:
+            x, y, c = st.get("x"), st.get("y"), st.get("color")
+            if isinstance(x, int) and isinstance(y, int) and Board.inside(x, y) and c in COLOR_CODE:
+                placed.append((x, y, c))
+        if not placed:
+            return {"success": False, "message": "沒有可落的子"}
+
+        before = self.board.snapshot()
+        for x, y, c in placed:
+            self.board.set(x, y, COLOR_CODE[c])
+        opponent = "white" if color == "black" else "black"
+        captures = self.board.remove_dead(COLOR_CODE[opponent])
+        captures += self.board.remove_dead(COLOR_CODE[color])
+        self.history.add(self.board.hash)
+
+        self.turn = opponent
+        self._record({"x": None, "y": None, "color": color, "stones": [list(p) for p in placed]})
+
+        changed = []
+        for x, y in dict.fromkeys([(x, y) for x, y, _ in placed] + captures):
+            v = self.board.get(x, y)
+            if v != before[Board.index(x, y)]:
+                changed.append({"x": x, "y": y, "color": COLOR_NAME[v]})
+        return {
+            "success": True,
+            "changes": changed,   # 只傳有變動的格子
+            "captures": captures,
+            "turn": opponent
+        }
+
+# 對局數量與閒置時間有上限：超過 capacity 或閒置超過 ttl 秒的對局依 LRU 淘汰。
+# 有 store（需提供 save(game_id, data) / load(game_id)）時，淘汰的對局會先存起來，
+# 之後再被存取時才還原
 class GameManager:
-    def __init__(self):
-        self.games = {}
+    def __init__(self, capacity=1000, ttl=30 * 60, store=None):
+        self.games = OrderedDict()   # 依最近存取排序，最舊的在最前面
+        self.last_used = {}
+        self.capacity = capacity
+        self.ttl = ttl
+        self.store = store
 
     def create_game(self):
         game_id = str(uuid.uuid4())
-        self.games[game_id] = Game()
+        self._touch(game_id, Game())
         return game_id
 
-    def place_stone(self, game_id, x, y, color):
+    def get_game(self, game_id):
         game = self.games.get(game_id)
+        if game is None and self.store and game_id:
+            data = self.store.load(game_id)
+            if data is not None:
+                game = Game.from_dict(data)
+        if game is not None:
+            self._touch(game_id, game)
+        return game
+
+    def _touch(self, game_id, game):
+        self.games[game_id] = game
+        self.games.move_to_end(game_id)
+        self.last_used[game_id] = time.monotonic()
+        self.evict()
+
+    def evict(self):
+        deadline = time.monotonic() - self.ttl
+        while self.games:
+            game_id = next(iter(self.games))
+            if len(self.games) <= self.capacity and self.last_used[game_id] > deadline:
+                break
+            game = self.games.pop(game_id)
+            del self.last_used[game_id]
+            # 沒下過的空局（例如重新連線產生的）直接丟掉
+            if self.store and game.moves:
+                self.store.save(game_id, game.to_dict())
+
+    def place_stone(self, game_id, x, y, color):
+        game = self.get_game(game_id)
         if game:
             return game.place_stone(x, y, color)
         return {"success": False, "message": "Game not found."}
 
     def reset_game(self, game_id):
-        game = self.games.get(game_id)
+        game = self.get_game(game_id)
         if game:
             return game.reset_board()
         return {"success": False, "message": "Game not found."}
     
     def apply_convolution(self,game_id, filter_name="default", turn="black"):
-        game = self.games.get(game_id)
+        game = self.get_game(game_id)
         if game:
             return game.apply_convolution(filter_name, turn)
         return {"success": False, "message": "Game not found."}
     
     def conv_place_stone(self, game_id, x, y, color):
-        game = self.games.get(game_id)
+        game = self.get_game(game_id)
         if game:
             return game.conv_place_stone(x, y, color)
         return {"success": False, "message": "Game not found."}
+
+    def conv_place_stones(self, game_id, stones, color):
+        game = self.get_game(game_id)
+        if game:
+            return game.conv_place_stones(stones, color)
+        return {"success": False, "message": "Game not found."}
@@ -1,6 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-import json
+from sqlalchemy import text
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from record_codec import encode_moves, decode_moves, iter_moves, move_count
+import json, queue, threading, atexit, time, traceback
 
 db = SQLAlchemy()
 
@@ -9,12 +12,304 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
 
+RECORDS_PER_PAGE = 20
+
 class GameRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    moves = db.Column(db.Text)
+    moves = db.deferred(db.Column(db.LargeBinary))     # record_codec 編碼；列表不需要，用到才載入
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index("ix_game_record_created_id", "created_at", "id"),)
+
+    # 依 (created_at, id) 由新到舊分頁（keyset）：before 為上一頁最後一筆的 cursor，
+    # 每頁成本只與 limit 有關，不會隨翻頁越來越慢；回傳 (紀錄, 下一頁 cursor 或 None)
+    @classmethod
+    def page(cls, before=None, limit=RECORDS_PER_PAGE, with_moves=False):
+        q = cls.query.order_by(cls.created_at.desc(), cls.id.desc())
+        if with_moves:
+            q = q.options(db.undefer(cls.moves))
+        if before:
+            q = q.filter(db.tuple_(cls.created_at, cls.id) < cls.parse_cursor(before))
+        rows = q.limit(limit + 1).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, rows[-1].cursor() if more else None
+
+    # 依 id 逐批讀出整張表（含棋譜），資料庫游標每次只取 chunk 筆，記憶體用量固定
+    @classmethod
+    def stream(cls, chunk=500):
+        q = cls.query.options(db.undefer(cls.moves)).order_by(cls.id)
+        return q.yield_per(chunk)
+
+    def cursor(self):
+        return f"{self.created_at.isoformat()}_{self.id}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        ts, _, rid = cursor.rpartition("_")
+        return datetime.fromisoformat(ts), int(rid)
+
+    @classmethod
+    def from_moves(cls, moves, **fields):
+        return cls(moves=encode_moves(moves), **fields)
+
     def get_moves(self):
-        return json.loads(self.moves)
+        return decode_moves(self.moves)
+
+    def iter_moves(self, start=0):
+        return iter_moves(self.moves, start)
+
+    def move_count(self):
+        return move_count(self.moves)
+
+# 舊版以 JSON 文字存的棋譜改寫成二進位，依 id 每次只處理 batch 筆；回傳改寫的筆數。
+# 舊版曾接受盤外座標等資料，無法編碼的紀錄維持 JSON（解碼端仍讀得懂），不擋住啟動。
+# create_all 不會替已存在的表補索引，這裡一併補上
+def upgrade_records(batch=500):
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_game_record_created_id "
+                            "ON game_record (created_at, id)"))
+    db.session.commit()
+    select = text("SELECT id, moves FROM game_record WHERE typeof(moves) = 'text' AND id > :after "
+                  "ORDER BY id LIMIT :n")
+    update = text("UPDATE game_record SET moves = :moves WHERE id = :id")
+    done, after = 0, 0
+    while True:
+        rows = db.session.execute(select, {"after": after, "n": batch}).all()
+        if not rows:
+            return done
+        params = []
+        for rid, moves in rows:
+            try:
+                params.append({"id": rid, "moves": encode_moves(json.loads(moves))})
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"對局紀錄 {rid} 無法轉成二進位棋譜，保留 JSON：{e!r}")
+        if params:
+            db.session.execute(update, params)
+            db.session.commit()
+        done += len(params)
+        after = rows[-1][0]
+
+# 棋譜的盤面檢查點：第 move 手下完後的盤面與下一手顏色，
+# 跳到第 k 手時從 move <= k 最近的一筆接著重播
+class RecordSnapshot(db.Model):
+    record_id = db.Column(db.Integer, db.ForeignKey("game_record.id"), primary_key=True)
+    move = db.Column(db.Integer, primary_key=True)
+    board = db.Column(db.LargeBinary, nullable=False)
+    turn = db.Column(db.String(5), nullable=False)
+
+    @classmethod
+    def nearest(cls, record_id, move):
+        return (cls.query.filter(cls.record_id == record_id, cls.move <= move)
+                .order_by(cls.move.desc()).first())
+
+# 被 GameManager 淘汰的閒置對局
+class SuspendedGame(db.Model):
+    id = db.Column(db.String(36), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    suspended_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# 背景寫入的共用部分：呼叫端只把資料丟進佇列，由單一背景執行緒一次取出多筆、
+# 在同一個 transaction 裡寫入（子類別實作 _commit）。
+# 整批失敗（例如 database is locked）會重試，仍失敗就改成逐筆寫，只放棄寫不進去的那幾筆；
+# 放進佇列永遠不等待，佇列滿了直接回 False；程式結束時會先把佇列寫完
+class BackgroundWriter:
+    name = "background-writer"
+
+    def __init__(self, app, maxsize=0, batch=100, retries=3):
+        self.app = app
+        self.queue = queue.Queue(maxsize)
+        self.batch = batch
+        self.retries = retries
+        self.dropped = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self, timeout=10):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            while items[-1] is not None and len(items) < self.batch:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = items[-1] is None
+            try:
+                self._write([it for it in items if it is not None])
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def _write(self, items):
+        if not items:
+            return
+        with self.app.app_context():
+            for attempt in range(self.retries):
+                if self._commit(items):
+                    return
+                time.sleep(0.1 * (attempt + 1))
+            for item in items:
+                if not self._commit([item]):
+                    self.dropped += 1
+                    self._drop(item)
+
+    def _drop(self, item):
+        print(f"{self.name} 寫入失敗，放棄 {item!r}")
+
+    def _commit(self, items):
+        raise NotImplementedError
+
+# GameManager 的溢出儲存。淘汰發生在 Socket.IO handler 裡，所以寫入與刪除都交給背景執行緒：
+# pending 記著還沒寫進資料庫的對局（None 表示待刪除），讀取先查 pending，
+# 再查確定不存在的 id（missing，有上限），兩者都沒有才查資料庫。
+# 暫存超過 max_age 秒的對局會被清掉：啟動時一次，之後每 purge_every 秒隨著寫入排一次
+_PURGE = object()
+
+class GameStore(BackgroundWriter):
+    name = "game-store"
+
+    def __init__(self, app, max_age=7 * 24 * 3600, purge_every=3600, missing_size=10000):
+        super().__init__(app)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.missing = OrderedDict()
+        self.missing_size = missing_size
+        self.max_age = max_age
+        self.purge_every = purge_every
+        self.next_purge = 0
+        # create_all 不會替已存在的表補索引
+        with app.app_context():
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_suspended_game_suspended_at "
+                                    "ON suspended_game (suspended_at)"))
+            db.session.commit()
+        self._schedule_purge()
+
+    def save(self, game_id, data):
+        # 在這裡就轉成 JSON：data 和仍在使用的 Game 共用 list，不能交給背景執行緒再讀
+        raw = json.dumps(data)
+        with self.lock:
+            self.pending[game_id] = raw
+            self.missing.pop(game_id, None)
+        self._put(game_id)
+        self._schedule_purge()
+
+    def load(self, game_id):
+        with self.lock:
+            if game_id in self.missing:
+                return None
+            raw = self.pending.get(game_id)
+            if game_id in self.pending and raw is None:
+                return None
+        if raw is None:
+            with self.app.app_context():
+                row = db.session.get(SuspendedGame, game_id)
+                raw = row.data if row is not None else None
+            if raw is None:
+                with self.lock:
+                    if game_id not in self.pending:
+                        self._mark_missing(game_id)
+                return None
+        # 讀出來的對局回到 GameManager，資料庫裡那份交給背景刪除
+        with self.lock:
+            self.pending[game_id] = None
+        self._put(game_id)
+        return json.loads(raw)
+
+    def _mark_missing(self, game_id):
+        self.missing[game_id] = True
+        self.missing.move_to_end(game_id)
+        while len(self.missing) > self.missing_size:
+            self.missing.popitem(last=False)
+
+    def _schedule_purge(self):
+        now = time.monotonic()
+        if now >= self.next_purge:
+            self.next_purge = now + self.purge_every
+            self._put(_PURGE)
+
+    def _commit(self, items):
+        with self.lock:
+            batch = {i: self.pending[i] for i in items if i is not _PURGE and i in self.pending}
+        try:
+            for game_id, raw in batch.items():
+                if raw is None:
+                    SuspendedGame.query.filter_by(id=game_id).delete()
+                else:
+                    db.session.merge(SuspendedGame(id=game_id, data=raw, suspended_at=datetime.utcnow()))
+            purged = 0
+            if any(i is _PURGE for i in items):
+                cutoff = datetime.utcnow() - timedelta(seconds=self.max_age)
+                purged = SuspendedGame.query.filter(SuspendedGame.suspended_at < cutoff).delete()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            traceback.print_exc()
+            return False
+        if purged:
+            print(f"清除 {purged} 局暫存超過 {self.max_age} 秒的對局")
+        # 寫入期間又被存入或讀出的對局留在 pending，等下一次
+        with self.lock:
+            for game_id, raw in batch.items():
+                if game_id in self.pending and self.pending[game_id] is raw:
+                    del self.pending[game_id]
+                    if raw is None:
+                        self._mark_missing(game_id)
+        return True
+
+    def _drop(self, game_id):
+        if game_id is not _PURGE:
+            print(f"暫存對局 {game_id} 寫入失敗，保留在記憶體中")
+
+# 對局紀錄的背景寫入：Socket.IO handler 只把紀錄丟進有上限的佇列；
+# submit 佇列滿了回 False 並記錄
+class RecordWriter(BackgroundWriter):
+    name = "record-writer"
+
+    def __init__(self, app, maxsize=1000, batch=100, retries=3):
+        super().__init__(app, maxsize, batch, retries)
+
+    def submit(self, moves, snapshots=()):
+        # 時間在結束當下就記下，寫入延遲不影響紀錄的先後順序
+        if self._put((datetime.utcnow(), moves, list(snapshots))):
+            return True
+        self.dropped += 1
+        print(f"對局紀錄佇列已滿，丟棄一局（{len(moves)} 手，累計丟棄 {self.dropped} 局）")
+        return False
+
+    def _drop(self, item):
+        print(f"對局紀錄寫入失敗，丟棄一局（{len(item[1])} 手，結束於 {item[0]}）")
 
-#test
\ No newline at end of file
+    def _commit(self, items):
+        try:
+            records = [GameRecord.from_moves(moves, created_at=ts) for ts, moves, _ in items]
+            db.session.add_all(records)
+            db.session.flush()
+            db.session.add_all(RecordSnapshot(record_id=rec.id, move=n, board=cells, turn=turn)
+                               for rec, (_, _, snaps) in zip(records, items)
+                               for n, cells, turn in snaps)
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            traceback.print_exc()
+            return False
@@ -0,0 +1,187 @@
+# 棋譜（GameRecord.moves）的二進位編碼
+# 開頭兩個位元組為版本與旗標，接著是手數（varint），之後每手一筆：
+#   落子   op | 顏色 << 2, x, y
+#   卷積   op | 下一手顏色 << 2, 名稱長度（varint）, 名稱（UTF-8）
+#   批次   op | 落子方顏色 << 2, 顆數（varint）, 每顆 x, y, 顏色
+# 旗標 FLAG_ZLIB 表示內容經過壓縮；解碼時逐塊解壓、逐手產生，不必整份展開。
+#
+# 第 2 版每 SEGMENT 手切一段，手數之後接著段長 SEGMENT、段數與前 n-1 段的位元組長度
+# （皆為 varint）；壓縮時在段與段之間做 full flush（raw deflate），
+# 所以可以直接從任一段開頭解起：跳到第 k 手只需解 k 所在的那一段。
+# 第 1 版（整份一個 zlib 串流、沒有分段）仍可解碼
+import json, zlib
+from itertools import islice
+
+VERSION = 2
+FLAG_ZLIB = 1
+OP_STONE, OP_FILTER, OP_BATCH = 0, 1, 2
+COLORS = (None, "black", "white")
+COLOR_CODE = {c: i for i, c in enumerate(COLORS)}
+SEGMENT = 32          # 與 game_logic.SNAPSHOT_EVERY 相同，快照剛好落在段的開頭
+CHUNK = 4096          # 每次解壓的輸入大小
+MIN_COMPRESS = 64     # 內容太短時壓縮只會更大
+
+
+def _varint(n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return out
+
+
+def _encode_move(body, mv):
+    if mv.get("filter") is not None:
+        name = mv["filter"].encode()
+        body.append(OP_FILTER | COLOR_CODE[mv.get("turn")] << 2)
+        body += _varint(len(name))
+        body += name
+    elif mv.get("stones") is not None:
+        body.append(OP_BATCH | COLOR_CODE[mv.get("color")] << 2)
+        body += _varint(len(mv["stones"]))
+        for x, y, color in mv["stones"]:
+            body += bytes((x, y, COLOR_CODE[color]))
+    else:
+        body.append(OP_STONE | COLOR_CODE[mv["color"]] << 2)
+        body += bytes((mv["x"], mv["y"]))
+
+
+def encode_moves(moves, compress=True, segment=SEGMENT):
+    segments = []
+    for i in range(0, len(moves), segment):
+        body = bytearray()
+        for mv in moves[i:i + segment]:
+            _encode_move(body, mv)
+        segments.append(bytes(body))
+    plain = sum(len(s) for s in segments)
+
+    flags = 0
+    if compress and plain >= MIN_COMPRESS:
+        z = zlib.compressobj(9, zlib.DEFLATED, -15)
+        packed = [z.compress(s) + z.flush(zlib.Z_FULL_FLUSH) for s in segments]
+        packed[-1] += z.flush()
+        if sum(len(s) for s in packed) < plain:
+            segments, flags = packed, FLAG_ZLIB
+
+    head = bytearray((VERSION, flags))
+    head += _varint(len(moves))
+    head += _varint(segment)
+    head += _varint(len(segments))
+    for s in segments[:-1]:
+        head += _varint(len(s))
+    return bytes(head) + b"".join(segments)
+
+
+class _Reader:
+    # 依需要從（可能壓縮的）內容取出位元組；wbits 同 zlib.decompressobj
+    def __init__(self, data, compressed, wbits=15):
+        self.src = data
+        self.z = zlib.decompressobj(wbits) if compressed else None
+        self.buf = b"" if compressed else bytes(data)
+        self.pos = 0
+
+    def _fill(self):
+        if self.z is None or not self.src:
+            return False
+        chunk, self.src = self.src[:CHUNK], self.src[CHUNK:]
+        self.buf = self.buf[self.pos:] + self.z.decompress(chunk)
+        self.pos = 0
+        return True
+
+    def need(self, n):
+        # 盡量讓緩衝區至少有 n 個位元組，回傳是否足夠
+        while len(self.buf) - self.pos < n:
+            if not self._fill():
+                return False
+        return True
+
+    def take(self, n):
+        if not self.need(n):
+            raise ValueError("棋譜資料不完整")
+        out = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return out
+
+    def varint(self):
+        n = shift = 0
+        while True:
+            b = self.take(1)[0]
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+
+def _header(blob):
+    # 回傳 (旗標, 手數, 段長, 各段在 blob 中的起點)；第 1 版整份視為一段
+    version = blob[0]
+    if version not in (1, VERSION):
+        raise ValueError(f"不支援的棋譜版本: {version}")
+    head = _Reader(memoryview(blob)[2:], False)
+    count = head.varint()
+    if version == 1:
+        return blob[1], count, max(count, 1), [2 + head.pos]
+    segment, n = head.varint(), head.varint()
+    lengths = [head.varint() for _ in range(n - 1)]
+    starts = [2 + head.pos]
+    for length in lengths:
+        starts.append(starts[-1] + length)
+    return blob[1], count, segment, starts
+
+
+def _is_legacy(blob):
+    # 遷移前的紀錄是 JSON 文字
+    return isinstance(blob, str) or blob[:1] == b"["
+
+
+def _parse(r, n):
+    for _ in range(n):
+        # 落子佔絕大多數：緩衝區夠 3 個位元組時直接從中取值
+        if r.need(3):
+            buf, pos = r.buf, r.pos
+            head = buf[pos]
+            if head & 3 == OP_STONE:
+                r.pos = pos + 3
+                yield {"x": buf[pos + 1], "y": buf[pos + 2], "color": COLORS[head >> 2]}
+                continue
+        head = r.take(1)[0]
+        op, color = head & 3, COLORS[head >> 2]
+        if op == OP_STONE:
+            x, y = r.take(2)
+            yield {"x": x, "y": y, "color": color}
+        elif op == OP_FILTER:
+            mv = {"x": None, "y": None, "color": None, "filter": r.take(r.varint()).decode()}
+            if color is not None:         # 舊版的卷積紀錄沒有 turn
+                mv["turn"] = color
+            yield mv
+        elif op == OP_BATCH:
+            stones = [[x, y, COLORS[c]] for x, y, c in (r.take(3) for _ in range(r.varint()))]
+            yield {"x": None, "y": None, "color": color, "stones": stones}
+        else:
+            raise ValueError(f"未知的棋譜指令: {op}")
+
+
+def iter_moves(blob, start=0):
+    # 從第 start 手（0 起算）開始逐手產生；第 2 版直接跳到所在的段，前面的段不解壓也不解碼
+    if _is_legacy(blob):
+        yield from islice(json.loads(blob), start, None)
+        return
+    flags, count, segment, starts = _header(blob)
+    if start >= count:
+        return
+    k = start // segment
+    wbits = -15 if blob[0] == VERSION else 15
+    r = _Reader(memoryview(blob)[starts[k]:], flags & FLAG_ZLIB, wbits)
+    yield from islice(_parse(r, count - k * segment), start - k * segment, None)
+
+
+def decode_moves(blob):
+    return list(iter_moves(blob))
+
+
+def move_count(blob):
+    # 只讀檔頭，不解碼內容
+    if _is_legacy(blob):
+        return len(json.loads(blob))
+    return _header(blob)[1]
@@ -0,0 +1,47 @@
+# 對局紀錄匯出格式：每筆紀錄轉成一段文字，方便邊讀資料庫邊輸出
+#   sgf    每局一棵 game tree，多局串起來就是 SGF collection；
+#          批次落子用 AB/AW，卷積卡用自訂屬性 FL（filter 名稱）與 PL（下一手顏色）
+#   ndjson 每局一行 JSON：{"id", "created_at", "moves"}
+import json
+
+SGF_COLOR = {"black": "B", "white": "W"}
+
+
+def _sgf_point(x, y):
+    return chr(ord("a") + x) + chr(ord("a") + y)
+
+
+def _sgf_text(s):
+    return s.replace("\\", "\\\\").replace("]", "\\]")
+
+
+def to_sgf(record_id, created_at, moves):
+    out = [f"(;GM[1]FF[4]CA[UTF-8]SZ[19]GN[{record_id}]"]
+    if created_at is not None:
+        out.append(f"DT[{created_at.date().isoformat()}]")
+    for mv in moves:
+        if mv.get("filter") is not None:
+            out.append(f"\n;FL[{_sgf_text(mv['filter'])}]PL[{SGF_COLOR.get(mv.get('turn'), 'B')}]")
+        elif mv.get("stones") is not None:
+            node = ["\n;"]
+            for color in ("black", "white"):
+                pts = "".join(f"[{_sgf_point(x, y)}]" for x, y, c in mv["stones"] if c == color)
+                if pts:
+                    node.append(f"A{SGF_COLOR[color]}{pts}")
+            out.append("".join(node))
+        else:
+            out.append(f"\n;{SGF_COLOR[mv['color']]}[{_sgf_point(mv['x'], mv['y'])}]")
+    out.append(")\n")
+    return "".join(out)
+
+
+def to_ndjson(record_id, created_at, moves):
+    return json.dumps({"id": record_id,
+                       "created_at": created_at.isoformat() if created_at else None,
+                       "moves": list(moves)}, ensure_ascii=False) + "\n"
+
+
+EXPORTERS = {
+    "sgf": (to_sgf, "application/x-go-sgf"),
+    "ndjson": (to_ndjson, "application/x-ndjson"),
+}
@@ -0,0 +1,201 @@
+# selfplay.py —— 卡牌對戰自我對戰（平衡測試用）
+# =============================================================
+# 直接驅動 card_engine.Match，不經過 Socket.IO；多行程平行跑，每局種子固定可重現。
+# 結果存成欄位式 .npz（每局一列），之後用 numpy / pandas 統計勝率與卡牌使用率。
+#
+#   python selfplay.py --games 100000 --p1 random --p2 shapes --out sweep.npz
+import argparse, os, random, shutil, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from board import Board, BOARD_SIZE, BLACK, WHITE
+from card_engine import Match, CARDS, make_deck
+
+N_CARDS = max(CARDS) + 1
+
+
+# ---------- 策略 ----------
+# 策略每次回傳一組 (card_id, params)，None 代表這回合不再出牌
+def _shape_params(m, pid, cid, rng):
+    fps = CARDS[cid]["footprints"]
+    if not fps:                       # 12 號隨機落子
+        return {}
+    d = rng.choice(list(fps))
+    ys, xs = np.nonzero(m.legal_mask(pid, fps[d]))
+    if not len(xs):
+        return None
+    k = rng.randrange(len(xs))
+    params = {"x": int(xs[k]), "y": int(ys[k]), "dir": d}
+    if m.state["effects"]["mirage_next"].get(pid):
+        empty = m.state["board"].empty_points
+        if empty:
+            sx, sy = Board.point(empty.choice(rng))
+            params["second"] = {"x": sx, "y": sy}
+    return params
+
+
+def _any_params(m, pid, rng):
+    # 功能 / 魔法牌的參數隨便給，不合法的會被規則擋下
+    p = lambda: {"x": rng.randrange(BOARD_SIZE), "y": rng.randrange(BOARD_SIZE)}
+    hand = m.state["hands"][pid]
+    return {"anchor": p(), "src": p(), "dst": p(), "dir": rng.choice("hv"),
+            "targets": [list(p().values()) for _ in range(4)],
+            "points": [list(p().values()) for _ in range(3)],
+            "card": rng.choice(hand) if hand else 1,
+            "discard": hand[:2]}
+
+
+def _affordable(m, pid):
+    energy = m.state["energy"][pid]
+    return [cid for cid in m.state["hands"][pid] if cid in CARDS and CARDS[cid]["cost"] <= energy]
+
+
+def policy_random(m, pid, rng):
+    cards = _affordable(m, pid)
+    if not cards:
+        return None
+    cid = rng.choice(cards)
+    if CARDS[cid]["kind"] == "shape":
+        params = _shape_params(m, pid, cid, rng)
+        return (cid, params) if params is not None else None
+    return cid, _any_params(m, pid, rng)
+
+
+def policy_shapes(m, pid, rng):
+    # 只下棋形卡，能量夠就先出最貴的
+    cards = sorted((c for c in _affordable(m, pid) if CARDS[c]["kind"] == "shape"),
+                   key=lambda c: -CARDS[c]["cost"])
+    for cid in cards:
+        params = _shape_params(m, pid, cid, rng)
+        if params is not None:
+            return cid, params
+    return None
+
+
+POLICIES = {"random": policy_random, "shapes": policy_shapes}
+
+
+# ---------- 牌組 ----------
+# default：與未自組牌組的玩家相同（只有棋形卡）；all：再加入功能 / 魔法牌各一張
+def deck_all(rng):
+    cards = list(make_deck(rng)) + [cid for cid, c in CARDS.items() if c["kind"] != "shape"]
+    return deque(cards)
+
+DECKS = {"default": make_deck, "all": deck_all}
+
+
+# ---------- 單局 ----------
+def play_game(seed, policies, deck="default", max_turns=60, max_actions=4):
+    rng = random.Random(f"policy-{seed}")     # 策略另用一個產生器，不影響對局本身的亂數
+    m = Match(seed)
+    m.decks = {"1": DECKS[deck](m.rng), "2": DECKS[deck](m.rng)}
+    m.start()
+    first = m.state["turn"]
+    plays = np.zeros((2, N_CARDS), dtype=np.uint16)
+    rejected = 0
+    while m.state["turnCount"] <= max_turns:
+        pid = str(m.state["turn"])
+        for _ in range(max_actions):
+            act = policies[pid](m, pid, rng)
+            if act is None:
+                break
+            if m.play_card(pid, *act):
+                plays[int(pid) - 1, act[0]] += 1
+            else:
+                rejected += 1
+            if str(m.state["turn"]) != pid:    # 踩到地雷會直接換手
+                break
+        if str(m.state["turn"]) == pid:        # 已經換手就不能再結束一次，否則對手的回合會被跳過
+            m.end_turn()
+        m.drain()
+    bd = m.state["board"]
+    stones = (len(bd.stone_points[BLACK]), len(bd.stone_points[WHITE]))
+    winner = 0 if stones[0] == stones[1] else (1 if stones[0] > stones[1] else 2)
+    return winner, m.state["turnCount"] - 1, first, stones, plays, rejected
+
+
+def play_chunk(args):
+    seeds, names, deck, max_turns, max_actions = args
+    policies = {"1": POLICIES[names[0]], "2": POLICIES[names[1]]}
+    n = len(seeds)
+    out = {"seed": np.asarray(seeds, dtype=np.int64),
+           "winner": np.zeros(n, np.int8), "turns": np.zeros(n, np.int16),
+           "first": np.zeros(n, np.int8), "stones": np.zeros((n, 2), np.int16),
+           "plays": np.zeros((n, 2, N_CARDS), np.uint16), "rejected": np.zeros(n, np.int32)}
+    for i, seed in enumerate(seeds):
+        (out["winner"][i], out["turns"][i], out["first"][i], out["stones"][i],
+         out["plays"][i], out["rejected"][i]) = play_game(seed, policies, deck, max_turns, max_actions)
+    return out
+
+
+# ---------- 彙總 ----------
+def summarize(cols, names):
+    n = len(cols["winner"])
+    w = np.bincount(cols["winner"], minlength=3) / max(n, 1)
+    lines = [f"{n} 局  {names[0]}(黑) 勝 {w[1]:.1%}  {names[1]}(白) 勝 {w[2]:.1%}  平手 {w[0]:.1%}",
+             f"平均回合 {cols['turns'].mean():.1f}  平均無效出牌 {cols['rejected'].mean():.1f}"]
+    used = cols["plays"].sum(axis=(0, 1))
+    top = [f"{c}:{used[c]}" for c in np.argsort(used)[::-1][:10] if used[c]]
+    lines.append("最常出的牌 " + " ".join(top))
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="卡牌對戰自我對戰")
+    ap.add_argument("--games", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0, help="第 i 局的種子為 seed+i")
+    ap.add_argument("--p1", choices=POLICIES, default="random")
+    ap.add_argument("--p2", choices=POLICIES, default="random")
+    ap.add_argument("--deck", choices=DECKS, default="all")
+    ap.add_argument("--turns", type=int, default=60, help="最多回合數，之後以盤上子數判勝負")
+    ap.add_argument("--actions", type=int, default=4, help="每回合最多嘗試出牌次數")
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--chunk", type=int, default=200, help="每個工作單位的局數")
+    ap.add_argument("--out", default="selfplay.npz")
+    a = ap.parse_args()
+
+    names = (a.p1, a.p2)
+    config = np.array([*names, a.deck, str(a.turns), str(a.actions)])
+    jobs = [(list(range(s, min(s + a.chunk, a.seed + a.games))), names, a.deck, a.turns, a.actions)
+            for s in range(a.seed, a.seed + a.games, a.chunk)]
+    # 每個工作單位完成就寫成一個分檔，中斷或當掉時已跑完的不會遺失；
+    # 用同樣參數重跑會直接讀回已有的分檔，只跑剩下的
+    parts_dir = a.out + ".parts"
+    os.makedirs(parts_dir, exist_ok=True)
+    part_path = lambda job: os.path.join(parts_dir, f"{job[0][0]}-{len(job[0])}.npz")
+    parts, todo = {}, []
+    for job in jobs:
+        path = part_path(job)
+        if os.path.exists(path):
+            with np.load(path) as f:
+                if np.array_equal(f["config"], config):
+                    parts[job[0][0]] = {k: f[k] for k in f.files if k != "config"}
+                    continue
+        todo.append(job)
+    done, t0 = sum(len(p["seed"]) for p in parts.values()), time.time()
+    if done:
+        print(f"沿用 {parts_dir} 中已完成的 {done} 局")
+    try:
+        with ProcessPoolExecutor(a.workers) as pool:
+            for job, part in zip(todo, pool.map(play_chunk, todo)):
+                np.savez(part_path(job), config=config, **part)
+                parts[job[0][0]] = part
+                done += len(part["seed"])
+                w = np.bincount(np.concatenate([p["winner"] for p in parts.values()]), minlength=3) / done
+                print(f"\r{done}/{a.games} 局  黑 {w[1]:.1%} 白 {w[2]:.1%}  "
+                      f"{done / (time.time() - t0):.1f} 局/秒", end="", flush=True)
+    except KeyboardInterrupt:
+        print(f"\n中斷；已完成的部分在 {parts_dir}，用同樣參數重跑會接著跑")
+        return
+    print()
+    if not parts:
+        return
+    order = [parts[job[0][0]] for job in jobs]
+    cols = {k: np.concatenate([p[k] for p in order]) for k in order[0]}
+    np.savez_compressed(a.out, policies=np.array(names), deck=np.array(a.deck), **cols)
+    shutil.rmtree(parts_dir)
+    print(summarize(cols, names))
+    print(f"→ {a.out}")
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,32 @@ function initSocketEvents(socket, ctx, cellSize,gameIdRef,lastMove, territoryHis
     onTurnChanged
 }) {
     socket.on("connect", () => {
-        
-        socket.emit("new_game");
+        // 斷線重連時回到原本的對局（否則開局者會被分到新房間，和對手失聯）；
+        // 第一次連線時網址帶 ?game=<id> 就加入既有對局（對手 / 觀戰），否則開新局
+        const joinId = gameIdRef.value || new URLSearchParams(location.search).get("game");
+        if (joinId) {
+            socket.emit("join_game", { game_id: joinId });
+        } else {
+            socket.emit("new_game");
+        }
+    });
+
+    socket.on("game_joined", (data) => {
+        if (!data.success) {
+            onMessage(data.message || "找不到對局");
+            socket.emit("new_game");
+            return;
+        }
+        gameIdRef.value = data.game_id;
+        setGameId(data.game_id);
+        for (let y = 0; y < data.board.length; y++) {
+            for (let x = 0; x < data.board[y].length; x++) {
+                boardState[y][x] = data.board[y][x];
+            }
+        }
+        updateCurrentColor(data.turn);
+        onTurnChanged(data.turn);
+        redrawBoard(ctx, boardState, cellSize, 19, lastMove.value);
     });
 
     socket.on("game_created", (data) => {
@@ -50,6 +74,49 @@ function initSocketEvents(socket, ctx, cellSize,gameIdRef,lastMove, territoryHis
 
         
     });
+
+    // 批次落子：只套用有變動的格子
+    socket.on("update_board_batch", (data) => {
+        if (!data.success) {
+            onMessage(data.message || "落子失敗");
+            return;
+        }
+        for (const c of data.changes) {
+            boardState[c.y][c.x] = c.color;
+        }
+        redrawBoard(ctx, boardState, cellSize, 19, lastMove.value);
+
+        updateCurrentColor(data.turn);
+        onTurnChanged(data.turn);
+        onMessage("");
+
+        const { nBlack, nWhite } = territoryEstimate(boardState, 19);
+        territoryHistory.push({ black: nBlack, white: nWhite });
+        drawTerritoryChart(territoryHistory);
+    });
+
+    // 卷積卡：伺服器回傳整個新盤面
+    socket.on("convolution_applied", (data) => {
+        if (!data.success) {
+            onMessage(data.message || "卷積失敗");
+            return;
+        }
+        for (let y = 0; y < data.board.length; y++) {
+            for (let x = 0; x < data.board[y].length; x++) {
+                boardState[y][x] = data.board[y][x];
+            }
+        }
+        lastMove.value = null;
+        redrawBoard(ctx, boardState, cellSize, 19, lastMove.value);
+
+        updateCurrentColor(data.turn);
+        onTurnChanged(data.turn);
+        onMessage("");
+
+        const { nBlack, nWhite } = territoryEstimate(boardState, 19);
+        territoryHistory.push({ black: nBlack, white: nWhite });
+        drawTerritoryChart(territoryHistory);
+    });
     
 }
 
@@ -83,18 +83,27 @@ let previewStones  = [];
 
 let handCollapsed = false;
 
+let serverState = null;   // 最近一次的完整公開狀態（快照 + 套用過的差異）
+let lastSeq     = -1;
+let legal       = null;   // 伺服器算好的合法錨點 {seq, masks:{cardId:{dir:hex}}}
+let legalAsked  = -1;
+
 socket.on("waiting", m => { overlay.textContent = m; overlay.style.display="flex"; });
-socket.on("start",   s => { overlay.style.display="none"; syncState(s); });
-socket.on("state",   syncState);
+socket.on("start",   s => { overlay.style.display="none"; applySnapshot(s); });
+socket.on("state",   applySnapshot);
+socket.on("delta",   applyDelta);
+socket.on("resume",  m => { overlay.style.display="none"; toast(m); });
 socket.on("hand:update", h => { hand=h; redrawHand(); updateEnergy(); });
 socket.on("error", e => toast(e.msg||e));
+socket.on("legal", m => { legal = m; if (selectedCardId) highlightAnchors(selectedCardId); });
 
 socket.on("connect", () => {
   socket.emit("join", {
     room   : ROOM_ID,
     player : playerIdStr,
     deck   : savedDeck,
-    slot   : deckSlot
+    slot   : deckSlot,
+    seq    : serverState ? lastSeq : null   // 斷線重連時只補送錯過的差異
   });
 });
 
@@ -118,7 +127,31 @@ document.addEventListener("DOMContentLoaded", () => {
   updateScoreBoard();
 });
 
-/* 狀態同步  */
+/* 狀態同步：快照直接取代，差異依 seq 依序套用，跳號就要求重送快照 */
+function applySnapshot(s){
+  serverState = s;
+  lastSeq     = s.seq;
+  syncState(s);
+}
+
+function applyDelta(d){
+  if (!serverState || d.seq <= lastSeq) return;
+  if (d.seq !== lastSeq + 1){
+    socket.emit("resync", { room: ROOM_ID, seq: lastSeq });
+    return;
+  }
+  const s = serverState;
+  (d.board || []).forEach(([x,y,v]) => { s.board[y][x] = v; });
+  Object.assign(s, d.set || {});
+  Object.assign(s.effects, d.effects || {});
+  if (d.placements){
+    s.placements.length = d.placements.from;
+    s.placements.push(...d.placements.items);
+  }
+  lastSeq = d.seq;
+  syncState(s);
+}
+
 function syncState(s){
   board      = s.board;
   current    = s.turn;
@@ -318,13 +351,28 @@ function highlightAnchors(id){
   highlightMap.length=0;
   previewStones.length=0;
   const dir = pendingParams.dir || "h";
+  const mask = legalMask(id, dir);
   for(let r=0;r<BOARD_SIZE;r++)
-    for(let c=0;c<BOARD_SIZE;c++)
-      if(CARD_EFFECTS[id].effect(board,current,{anchor:{x:c,y:r},dir}).ok)
+    for(let c=0;c<BOARD_SIZE;c++){
+      const i = r*BOARD_SIZE + c;
+      if(mask ? (parseInt(mask.substr((i>>3)*2,2),16) >> (i&7)) & 1
+              : CARD_EFFECTS[id].effect(board,current,{anchor:{x:c,y:r},dir}).ok)
         highlightMap.push([r,c]);
+    }
   redraw();
 }
 
+/* 形狀牌的合法錨點以伺服器遮罩為準（含結界與自殺判定）；
+   還沒拿到這個版本的遮罩時先向伺服器要，期間用本地判斷 */
+function legalMask(id, dir){
+  if (legal && legal.seq === lastSeq) return legal.masks[id]?.[dir];
+  if (legalAsked !== lastSeq){
+    legalAsked = lastSeq;
+    socket.emit("legal", { room: ROOM_ID });
+  }
+  return undefined;
+}
+
 function updateScoreBoard(){
   const {black,white} = computeScore();
   if(scoreBlackEl) scoreBlackEl.textContent = black;
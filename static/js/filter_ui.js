@@ -1,4 +1,3 @@
-import { convolutionByRowUpdate } from "./conv.js";
 // 建立卡片選擇器模組
 export function createCardSelector(uiFns) {
     let selectedCardElement = null;
@@ -120,27 +119,13 @@ export function registerApplyHandler({
         // 本地翻牌
         selector.markUsed();
 
-        // 卷積運算 + 同步記錄
-        convolutionByRowUpdate(
-            boardState,
-            boardSize,
-            (x, y, color) => {
-                socket.emit("conv_place_stone", { game_id: gameIdRef.value, x, y, color });
-            },
-            currentColorRef,
-            (color) => {
-                socket.emit("apply_convolution", {
-                    game_id: gameIdRef.value,
-                    filter: selected.id,
-                    color: color
-                });
-            },
-            gameIdRef.value,
-            selected.matrix,
-            socket
-        );
-        onTurnChanged(currentColorRef.value);
-
+        // 卷積運算交給伺服器：整盤一次改寫並結算提子，結果由 "convolution_applied" 回傳
+        const next = (currentColorRef.value === "black") ? "white" : "black";
+        socket.emit("apply_convolution", {
+            game_id: gameIdRef.value,
+            filter: selected.id,
+            color: next
+        });
     };
 }
 
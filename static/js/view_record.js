@@ -3,14 +3,7 @@ const ctx = canvas.getContext("2d");
 const cellSize = 30;
 const boardSize = 19;
 let currentStep = 0;
-let moves = [];
-
-try {
-  moves = JSON.parse(document.getElementById("movesData").value);
-  console.log("moves:", moves);
-} catch (err) {
-  console.error("parse movesData error:", err);
-}
+const totalMoves = Number(canvas.dataset.total) || 0;
 
 function drawBoard() {
   ctx.fillStyle = "#8B7765";
@@ -36,13 +29,21 @@ function drawStone(x, y, color) {
   console.log("drawStone:", x, y, color);
 }
 
+// 盤面由伺服器從最近的快照重建（含提子與卷積），不必在前端從第 1 手重播
+const recordId = canvas.dataset.recordId;
+
 function renderStep(step) {
-  drawBoard();
   console.log("renderStep:", step);
-  for (let i = 0; i < step && i < moves.length; i++) {
-    let move = moves[i];
-    drawStone(move.x, move.y, move.color);
-  }
+  fetch(`/api/records/${recordId}/position?move=${step}`)
+    .then(res => res.json())
+    .then(data => {
+      if (!data.success || step !== currentStep) return;   // 已經跳到別手就丟掉
+      drawBoard();
+      data.board.forEach((row, y) => row.forEach((color, x) => {
+        if (color) drawStone(x, y, color);
+      }));
+    })
+    .catch(err => console.error("position error:", err));
 }
 
 document.getElementById("prevMove").addEventListener("click", () => {
@@ -54,7 +55,7 @@ document.getElementById("prevMove").addEventListener("click", () => {
 });
 
 document.getElementById("nextMove").addEventListener("click", () => {
-  if (currentStep < moves.length) {
+  if (currentStep < totalMoves) {
     currentStep++;
     console.log("nextMove, currentStep:", currentStep);
     renderStep(currentStep);
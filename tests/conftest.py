@@ -0,0 +1,17 @@
+import pytest
+from flask import Flask
+
+from models import db
+
+
+# 每個測試一個獨立的 SQLite 檔，不碰 instance/users.db
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
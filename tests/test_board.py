@@ -0,0 +1,163 @@
+import random
+
+from board import Board, BOARD_SIZE, EMPTY, BLACK, WHITE
+from game_logic import Game
+
+STONE = {".": EMPTY, "X": BLACK, "O": WHITE}
+
+
+# 由左上角畫起的局部盤面，其餘為空
+def _board(*rows):
+    cells = bytearray(BOARD_SIZE * BOARD_SIZE)
+    for y, row in enumerate(rows):
+        for x, c in enumerate(row):
+            cells[Board.index(x, y)] = STONE[c]
+    return Board(cells)
+
+
+def _game(board, turn):
+    game = Game()
+    game.board = board
+    game.turn = turn
+    game.history = {board.hash}
+    return game
+
+
+def test_single_capture():
+    b = _board("OX")
+    assert sorted(b.place(0, 1, BLACK)) == [(0, 0)]
+    assert b.get(0, 0) == EMPTY
+    assert b.liberties(1, 0) == {Board.index(0, 0), Board.index(2, 0), Board.index(1, 1)}
+
+
+def test_one_move_captures_several_chains():
+    b = _board(".OX",
+               "OX.",
+               "X..")
+    i = Board.index(0, 0)
+    assert len(b.would_capture(i, BLACK)) == 2
+    assert not b.is_suicide(i, BLACK)               # 會提子就不是自殺
+    assert sorted(b.place(0, 0, BLACK)) == [(0, 1), (1, 0)]
+    assert b.liberties(0, 0) == {Board.index(1, 0), Board.index(0, 1)}
+
+
+def test_capture_whole_chain():
+    b = _board("OOX",
+               ".X.")
+    assert sorted(b.place(0, 1, BLACK)) == [(0, 0), (1, 0)]
+    assert b == _board("..X",
+                       "XX.")
+
+
+def test_suicide():
+    b = _board(".X",
+               "X.")
+    i = Board.index(0, 0)
+    assert b.is_suicide(i, WHITE)
+    assert not b.is_suicide(i, BLACK)
+    game = _game(b, "white")
+    assert game.place_stone(0, 0, "white")["message"] == "Suicide move."
+    assert game.board.get(0, 0) == EMPTY
+
+    # 填掉己方棋串最後一口氣也是自殺
+    b = _board(".OX",
+               "OX.",
+               "XX.")
+    assert b.is_suicide(i, WHITE)
+
+
+# 三個劫並排（KO 為各劫左上角的 x 位移）：黑在 (2,1) 提著劫，或白在 (1,1) 提著劫
+KO = (0, 6, 12)
+
+
+def _kos(*states):
+    line = [list("." * BOARD_SIZE) for _ in range(3)]
+    for off, state in zip(KO, states):
+        for dx, dy, c in ((1, 0, "X"), (2, 0, "O"), (0, 1, "X"), (3, 1, "O"), (1, 2, "X"), (2, 2, "O")):
+            line[dy][off + dx] = c
+        if state == "b":
+            line[1][off + 2] = "X"
+        else:
+            line[1][off + 1] = "O"
+    return _board(*("".join(r) for r in line))
+
+
+def test_simple_ko_is_rejected():
+    game = _game(_kos("b", "w", "b"), "white")
+    res = game.place_stone(1, 1, "white")
+    assert res["success"] and res["captures"] == [(2, 1)]
+    res = game.place_stone(2, 1, "black")           # 立刻提回
+    assert not res["success"] and "劫" in res["message"]
+
+    # 找劫材之後可以提回
+    assert game.place_stone(10, 10, "black")["success"]
+    assert game.place_stone(10, 11, "white")["success"]
+    assert game.place_stone(2, 1, "black")["success"]
+
+
+def test_triple_ko_cycle_is_rejected_by_superko():
+    game = _game(_kos("b", "w", "b"), "white")
+    start = game.board.snapshot()
+    for x, y, color in ((1, 1, "white"), (8, 1, "black"), (13, 1, "white"),
+                        (2, 1, "black"), (7, 1, "white")):
+        assert game.place_stone(x, y, color)["success"], (x, y, color)
+    # 再提第三個劫就回到開始的盤面；上一手提的是別的劫，單純的劫判斷擋不住
+    assert game.board.hash_after(Board.index(14, 1), BLACK) == Board(start).hash
+    res = game.place_stone(14, 1, "black")
+    assert not res["success"] and "劫" in res["message"]
+
+
+def test_hash_after_matches_the_played_position():
+    rng = random.Random(7)
+    b = Board()
+    checked = 0
+    for n in range(600):
+        color = (BLACK, WHITE)[n % 2]
+        empty = list(b.empty_points)
+        for i in rng.sample(empty, min(8, len(empty))):
+            if b.is_suicide(i, color):
+                continue
+            after = b.copy()
+            x, y = Board.point(i)
+            after.place(x, y, color)
+            assert b.hash_after(i, color) == after.hash
+            assert Board(after.snapshot()).hash == after.hash
+            checked += 1
+        legal = [i for i in b.empty_points if not b.is_suicide(i, color)]
+        if not legal:
+            break
+        x, y = Board.point(rng.choice(legal))
+        b.place(x, y, color)
+    assert checked > 1000
+
+
+def test_remove_dead_after_rewrite():
+    b = _board("OX",
+               "X.")
+    assert b.remove_dead(BLACK) == []
+    assert b.remove_dead(WHITE) == [(0, 0)]
+
+    # 直接改盤（不提子）可能同時留下兩色的死棋：先提白，黑子就有氣了
+    b = _board("XO.",
+               "OO.")
+    b.set(2, 0, BLACK)
+    b.set(2, 1, BLACK)
+    b.set(0, 2, BLACK)
+    b.set(1, 2, BLACK)
+    assert sorted(b.remove_dead(WHITE)) == [(0, 1), (1, 0), (1, 1)]
+    assert b.remove_dead(BLACK) == []
+    assert b.liberties(0, 0) == {Board.index(1, 0), Board.index(0, 1)}
+
+
+def test_dead_chains_reports_each_chain_once():
+    b = _board("OOX",
+               "...",
+               "O..")
+    b.set(0, 1, BLACK)
+    b.set(1, 1, BLACK)
+    b.set(1, 2, BLACK)
+    roots = b.dead_chains([(0, 1), (1, 1), (1, 2)], BLACK)
+    assert sorted(sorted(b.chain(r)) for r in roots) == [[(0, 0), (1, 0)]]
+    # (0,2) 的白子還有 (0,3) 一口氣
+    assert b.capture(roots[0], keep={(1, 0)}) == [(0, 0)]
+    assert b.get(1, 0) == WHITE and b.get(0, 0) == EMPTY
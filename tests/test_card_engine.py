@@ -0,0 +1,109 @@
+import random
+
+from board import Board, BOARD_SIZE
+from card_engine import Match, CARDS
+
+
+def _match(seed=1):
+    m = Match(seed)
+    m.start()
+    return m
+
+
+def _give(m, pid, *cards):
+    m.state["hands"][pid] = list(cards)
+    m.state["energy"][pid] = 10
+    m._touch("hands", "energy")
+
+
+def test_fired_mines_are_pruned():
+    m = _match()
+    pid = str(m.state["turn"])
+    opp = "2" if pid == "1" else "1"
+    _give(m, pid, 43)
+    assert m.play_card(pid, 43, {"points": [[3, 3], [5, 5], [7, 7]]})
+    m.end_turn()
+
+    _give(m, opp, 1)
+    before = m.versions["mines"]
+    assert m.play_card(opp, 1, {"x": 5, "y": 5, "dir": "h"})
+    assert [mine["pos"] for mine in m.state["effects"]["mines"]] == [(3, 3), (7, 7)]
+    assert m.versions["mines"] > before
+    assert str(m.state["turn"]) == pid              # 踩雷直接換手
+
+
+def test_versions_follow_mutations():
+    m = _match()
+    pid = str(m.state["turn"])
+    _give(m, pid, 39)                               # 39 號：小精靈
+    seen = dict(m.versions)
+    assert m.play_card(pid, 39, {})
+    changed = {k for k, n in m.versions.items() if seen.get(k) != n}
+    assert {"pixie", "energy", "hands", "grave", "playCount"} <= changed
+    assert "turn" not in changed
+
+    seen = dict(m.versions)
+    m.play_card(pid, 999, {})                       # 不合法：不動任何欄位
+    assert m.versions == seen
+
+
+# 隨機盤面（密度高，才有提子與自殺）、隨機守護，外加三種結界：
+# 對手的單邊結界（擋 pid）、pid 自己的雙邊結界（也擋 pid）、pid 自己的單邊結界（不擋）
+def _position(seed):
+    rng = random.Random(seed)
+    cells = [rng.choice((0, 0, 0, 1, 1, 2, 2)) for _ in range(BOARD_SIZE * BOARD_SIZE)]
+    guard = [(rng.randrange(BOARD_SIZE), rng.randrange(BOARD_SIZE)) for _ in range(rng.randrange(12))]
+    pid = rng.choice("12")
+    opp = "2" if pid == "1" else "1"
+    barriers = [{"rect": ((2, 2), (6, 6)), "until": 9, "both": False, "owner": opp},
+                {"rect": ((12, 3), (14, 5)), "until": 9, "both": True, "owner": pid},
+                {"rect": ((8, 12), (11, 15)), "until": 9, "both": False, "owner": pid}]
+    return cells, guard, barriers, pid
+
+
+def _setup(position):
+    cells, guard, barriers, pid = position
+    m = Match(0)
+    m.state["board"] = Board(cells)
+    m.state["effects"]["guard"] = {p: True for p in guard}
+    for b in barriers:
+        m._add_barrier(dict(b))
+    m.state["turn"] = int(pid)
+    m.state["energy"][pid] = 10
+    return m
+
+
+def test_legal_mask_matches_play_card():
+    rng = random.Random(0)
+    shapes = [(cid, d) for cid, card in CARDS.items() if card["kind"] == "shape"
+              for d in card["footprints"]]
+    checked = {True: 0, False: 0}
+    for seed in range(4):
+        position = _position(seed)
+        pid = position[3]
+        base = _setup(position)
+        for cid, d in shapes:
+            mask = base.legal_mask(pid, CARDS[cid]["footprints"][d])
+            legal = [(x, y) for y in range(BOARD_SIZE) for x in range(BOARD_SIZE) if mask[y, x]]
+            # 每個方向抽幾個合法錨點與幾個任意錨點，逐一真的出牌
+            anchors = rng.sample(legal, min(3, len(legal)))
+            anchors += [(rng.randrange(BOARD_SIZE), rng.randrange(BOARD_SIZE)) for _ in range(6)]
+            for x, y in anchors:
+                m = _setup(position)
+                m.state["hands"][pid] = [cid]
+                ok = m.play_card(pid, cid, {"x": x, "y": y, "dir": d})
+                assert ok == bool(mask[y, x]), (seed, cid, d, x, y, m.drain())
+                checked[ok] += 1
+    assert checked[True] > 100 and checked[False] > 100
+
+
+# 守護的棋子不會被提：黑下 (0,0) 要靠提掉 (1,0) 或 (0,1) 的白子才有氣
+def test_legal_mask_respects_guard():
+    cells = [0] * (BOARD_SIZE * BOARD_SIZE)
+    for (x, y), c in {(1, 0): 2, (0, 1): 2, (2, 0): 1, (1, 1): 1, (0, 2): 1}.items():
+        cells[Board.index(x, y)] = c
+    for guard, legal in (([], True), ([(1, 0)], True), ([(1, 0), (0, 1)], False)):
+        m = _setup((cells, guard, [], "1"))
+        assert bool(m.legal_mask("1", CARDS[1]["footprints"]["h"])[0, 0]) == legal
+        m.state["hands"]["1"] = [1]
+        assert m.play_card("1", 1, {"x": 0, "y": 0, "dir": "h"}) == legal
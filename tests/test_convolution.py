@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from board import Board, BOARD_SIZE, EMPTY, BLACK, WHITE
+from filter import FILTER_POOL
+from game_logic import Game, FILTERS, convolve_board
+
+STONE = {".": EMPTY, "X": BLACK, "O": WHITE}
+
+
+def _cells(*rows, at=(0, 0)):
+    cells = bytearray(BOARD_SIZE * BOARD_SIZE)
+    for y, row in enumerate(rows):
+        for x, c in enumerate(row):
+            cells[Board.index(at[0] + x, at[1] + y)] = STONE[c]
+    return bytes(cells)
+
+
+# 輸入：黑 (3,3)、(3,4)，白 (4,3)；結果只會落在 (2,2)–(5,5)，其餘全空
+SOURCE = _cells("XO",
+                "X.", at=(3, 3))
+EXPECTED = {
+    "sobel":         ("OXXO",
+                      ".O.X",
+                      ".X.O",
+                      "O.X."),
+    "laplacian":     ("OXO.",
+                      "..XO",
+                      "XXOX",
+                      ".XO."),
+    "edge":          ("O..X",
+                      "OXOX",
+                      "OXOX",
+                      "OOO."),
+    "invert_center": (".OX.",
+                      "OXOX",
+                      "OX..",
+                      ".O.."),
+    "diag_split":    ("OXXO",
+                      "O.X.",
+                      "XOOX",
+                      "X.O."),
+    "stealth":       (".OX.",
+                      "OXOX",
+                      "OX..",
+                      ".O.."),
+}
+
+
+def test_every_filter_is_pinned():
+    assert set(EXPECTED) == {f["id"] for f in FILTER_POOL}
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_filter_output(name):
+    assert convolve_board(SOURCE, FILTERS[name]) == _cells(*EXPECTED[name], at=(2, 2))
+
+
+def test_edges_are_zero_padded():
+    # 角落的黑子：盤外視為空點，不會從另一邊繞回來
+    out = convolve_board(_cells("X"), FILTERS["edge"])
+    assert out == _cells("XO",
+                         "OO")
+
+
+# 恆等 kernel：卷積後盤面不變，只看提子的結算順序
+@pytest.fixture
+def identity(monkeypatch):
+    kernel = np.zeros((3, 3))
+    kernel[1, 1] = 1
+    monkeypatch.setitem(FILTERS, "identity", kernel)
+
+
+# 兩色都沒有氣：黑 (0,0) 被白棋串包住，白棋串又被外圍黑子包住
+BOTH_DEAD = ("XOX",
+             "OOX",
+             "XX.")
+
+
+def _convolve(turn):
+    game = Game()
+    game.board = Board(_cells(*BOTH_DEAD))
+    return game, game.apply_convolution("identity", turn)
+
+
+def test_target_side_is_captured_first(identity):
+    # 黑方施放（輪到白）：先提白，黑 (0,0) 因此有氣而留下
+    game, res = _convolve("white")
+    assert sorted(map(tuple, res["captures"])) == [(0, 1), (1, 0), (1, 1)]
+    assert game.board == Board(_cells("X.X",
+                                      "..X",
+                                      "XX."))
+
+
+def test_caster_is_captured_only_if_still_dead(identity):
+    # 白方施放（輪到黑）：先提黑 (0,0)，白棋串多出一口氣，不再被提
+    game, res = _convolve("black")
+    assert sorted(map(tuple, res["captures"])) == [(0, 0)]
+    assert game.board == Board(_cells(".OX",
+                                      "OOX",
+                                      "XX."))
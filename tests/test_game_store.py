@@ -0,0 +1,79 @@
+import threading
+from datetime import datetime, timedelta
+
+from game_logic import Game, GameManager
+from models import db, GameStore, SuspendedGame
+
+
+def _rows(app):
+    with app.app_context():
+        return {row.id: row for row in SuspendedGame.query.all()}
+
+
+def test_evicted_game_round_trips_through_the_store(app):
+    store = GameStore(app)
+    manager = GameManager(capacity=1, store=store)
+    first = manager.create_game()
+    manager.place_stone(first, 3, 3, "black")
+    manager.create_game()                       # 擠掉 first
+    assert first not in manager.games
+    store.flush()
+    assert first in _rows(app)
+
+    game = manager.get_game(first)
+    assert game.board_rows()[3][3] == "black"
+    store.flush()
+    assert first not in _rows(app)
+    store.close()
+
+
+def _no_db(*args):
+    raise AssertionError("查了資料庫")
+
+
+def test_load_is_served_from_pending_before_the_write(app, monkeypatch):
+    store = GameStore(app)
+    store.flush()
+    gate = threading.Event()                    # 擋住背景執行緒，資料只在 pending 裡
+    commit = store._commit
+    monkeypatch.setattr(store, "_commit", lambda items: gate.wait() and commit(items))
+    monkeypatch.setattr(db.session, "get", _no_db)
+    game = Game()
+    game.place_stone(0, 0, "black")
+    store.save("g", game.to_dict())
+    assert store.load("g")["moves"] == game.moves
+    assert store.load("g") is None             # 已經讀出，只剩待刪除
+    gate.set()
+    store.flush()
+    assert _rows(app) == {}
+    assert "g" in store.missing
+    store.close()
+
+
+def test_missing_ids_are_cached(app, monkeypatch):
+    store = GameStore(app, missing_size=2)
+    store.flush()
+    assert store.load("nope") is None
+    assert "nope" in store.missing
+    monkeypatch.setattr(db.session, "get", _no_db)
+    assert store.load("nope") is None
+    monkeypatch.undo()
+
+    store.load("a")
+    store.load("b")
+    assert list(store.missing) == ["a", "b"]    # 超過上限丟掉最舊的
+
+    store.save("a", Game().to_dict())           # 存入後就不再是不存在
+    assert "a" not in store.missing
+    store.close()
+
+
+def test_old_suspended_games_are_purged(app):
+    with app.app_context():
+        db.session.add(SuspendedGame(id="old", data="{}", suspended_at=datetime.utcnow() - timedelta(days=30)))
+        db.session.add(SuspendedGame(id="new", data="{}"))
+        db.session.commit()
+    store = GameStore(app, max_age=24 * 3600)
+    store.flush()
+    assert set(_rows(app)) == {"new"}
+    store.close()
@@ -0,0 +1,112 @@
+import json
+import zlib
+
+from game_logic import Game
+from record_codec import encode_moves, decode_moves, iter_moves, move_count, _encode_move, _varint
+
+# 舊版（JSON 文字）棋譜照當時的寫入流程組成：一般落子；卷積卡由前端算好後逐顆送
+# conv_place_stone（依列由上而下），最後才送 apply_convolution，只留下沒有 turn 的標記
+def _stone(x, y, color):
+    return {"x": x, "y": y, "color": color}
+
+LEGACY = [
+    _stone(3, 3, "black"),
+    _stone(15, 15, "white"),
+    # 黑方施放 sobel 的結果
+    _stone(4, 2, "black"), _stone(2, 2, "white"),
+    _stone(2, 3, "black"), _stone(4, 3, "white"),
+    _stone(2, 4, "white"), _stone(4, 4, "black"),
+    _stone(16, 14, "white"), _stone(14, 14, "black"),
+    _stone(14, 15, "white"), _stone(16, 15, "black"),
+    _stone(14, 16, "black"), _stone(16, 16, "white"),
+    {"x": None, "y": None, "color": None, "filter": "sobel"},
+    _stone(10, 10, "white"),
+]
+LEGACY[2:8] = sorted(LEGACY[2:8], key=lambda m: (m["y"], m["x"]))
+LEGACY[8:14] = sorted(LEGACY[8:14], key=lambda m: (m["y"], m["x"]))
+
+# 逐顆 conv 落子只覆蓋結果有子的格子，原本的 (3,3)、(15,15) 仍留在盤上
+EXPECTED = {
+    "black": {(3, 3), (4, 2), (2, 3), (4, 4), (14, 14), (16, 15), (14, 16)},
+    "white": {(15, 15), (2, 2), (4, 3), (2, 4), (16, 14), (14, 15), (16, 16), (10, 10)},
+}
+
+
+def _stones(game):
+    rows = game.board_rows()
+    return {color: {(x, y) for y, row in enumerate(rows) for x, c in enumerate(row) if c == color}
+            for color in ("black", "white")}
+
+
+def test_legacy_json_round_trip_replays():
+    blob = encode_moves(json.loads(json.dumps(LEGACY)))
+    moves = decode_moves(blob)
+    assert move_count(blob) == len(LEGACY)
+    assert "turn" not in moves[14]
+    # 沒有 turn 的卷積標記不能再卷積一次
+    assert _stones(Game.replay(moves[:14])) == _stones(Game.replay(moves[:15]))
+    assert _stones(Game.replay(moves)) == EXPECTED
+
+
+def test_current_game_round_trip_replays():
+    game = Game()
+    game.place_stone(3, 3, "black")
+    game.place_stone(15, 15, "white")
+    game.apply_convolution("sobel", "white")
+    game.conv_place_stones([{"x": 10, "y": 10, "color": "white"}, {"x": 10, "y": 11, "color": "black"}], "white")
+    game.conv_place_stone(0, 0, "white")
+    moves = decode_moves(encode_moves(game.moves))
+    assert moves == game.moves
+    assert Game.replay(moves).board_rows() == game.board_rows()
+
+
+def test_compressed_and_plain_decode_alike():
+    moves = [{"x": i % 19, "y": i // 19 % 19, "color": ("black", "white")[i % 2]} for i in range(500)]
+    assert decode_moves(encode_moves(moves)) == moves
+    assert decode_moves(encode_moves(moves, compress=False)) == moves
+
+
+def test_legacy_text_is_still_readable():
+    text = json.dumps(LEGACY)
+    assert decode_moves(text) == LEGACY
+    assert move_count(text.encode()) == len(LEGACY)
+
+
+def _mixed_moves(n):
+    moves = []
+    for i in range(n):
+        if i % 37 == 5:
+            moves.append({"x": None, "y": None, "color": None, "filter": "sobel", "turn": "white"})
+        elif i % 41 == 7:
+            moves.append({"x": None, "y": None, "color": "black", "stones": [[i % 19, 0, "black"], [0, i % 19, "white"]]})
+        else:
+            moves.append({"x": i % 19, "y": i // 19 % 19, "color": ("black", "white")[i % 2]})
+    return moves
+
+
+# 分段編碼：從任一手開始解碼，結果要和整份解碼後切片一樣
+def test_iter_moves_seeks_to_any_move():
+    moves = _mixed_moves(200)
+    for compress in (True, False):
+        blob = encode_moves(moves, compress=compress)
+        assert move_count(blob) == len(moves)
+        for start in (0, 1, 31, 32, 33, 64, 150, 199, 200, 250):
+            assert list(iter_moves(blob, start)) == moves[start:]
+
+
+def test_empty_record_round_trips():
+    blob = encode_moves([])
+    assert decode_moves(blob) == []
+    assert list(iter_moves(blob, 5)) == []
+
+
+# 第 1 版：整份一個 zlib 串流，沒有分段資訊
+def test_version_1_blob_is_still_readable():
+    moves = _mixed_moves(100)
+    body = bytearray()
+    for mv in moves:
+        _encode_move(body, mv)
+    blob = bytes((1, 1)) + bytes(_varint(len(moves))) + zlib.compress(bytes(body))
+    assert decode_moves(blob) == moves
+    assert list(iter_moves(blob, 70)) == moves[70:]
+    assert move_count(blob) == len(moves)
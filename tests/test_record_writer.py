@@ -0,0 +1,99 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import models
+from models import GameRecord, RecordWriter
+
+GOOD = [{"x": 3, "y": 3, "color": "black"}]
+BAD = [{"x": 3, "y": 3, "color": "red"}]           # 編碼失敗，這一局永遠寫不進去
+
+
+def _item(moves):
+    return (datetime.utcnow(), moves, [])
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(models.time, "sleep", slept.append)
+    return slept
+
+
+@pytest.fixture
+def writer(app):
+    w = RecordWriter(app, retries=3)
+    yield w
+    w.close()
+
+
+def _spy(monkeypatch, w, fail_first=0):
+    # 記下每次 _commit 的筆數；前 fail_first 次直接回報失敗
+    calls = []
+    commit = w._commit
+
+    def spy(items):
+        calls.append(len(items))
+        if len(calls) <= fail_first:
+            return False
+        return commit(items)
+    monkeypatch.setattr(w, "_commit", spy)
+    return calls
+
+
+def _count(app):
+    with app.app_context():
+        return GameRecord.query.count()
+
+
+def test_batch_is_retried_after_one_failure(app, writer, monkeypatch, sleeps):
+    calls = _spy(monkeypatch, writer, fail_first=1)
+    writer._write([_item(GOOD) for _ in range(3)])
+    assert calls == [3, 3]
+    assert sleeps == [0.1]
+    assert writer.dropped == 0
+    assert _count(app) == 3
+
+
+def test_falls_back_to_one_record_at_a_time(app, writer, monkeypatch, sleeps):
+    calls = _spy(monkeypatch, writer)
+    writer._write([_item(GOOD), _item(BAD), _item(GOOD)])
+    assert calls == [3, 3, 3, 1, 1, 1]              # 整批重試 retries 次，再逐筆
+    assert sleeps == pytest.approx([0.1, 0.2, 0.3])
+    assert writer.dropped == 1
+    assert _count(app) == 2
+
+
+def test_everything_dropped_when_commit_always_fails(app, writer, monkeypatch, sleeps):
+    calls = _spy(monkeypatch, writer, fail_first=10 ** 9)
+    writer._write([_item(GOOD) for _ in range(4)])
+    assert calls == [4, 4, 4, 1, 1, 1, 1]
+    assert writer.dropped == 4
+    assert _count(app) == 0
+
+
+def test_submit_does_not_block_when_full(app, monkeypatch):
+    w = RecordWriter(app, maxsize=2)
+    entered, release = threading.Event(), threading.Event()
+    commit = w._commit
+
+    def blocked(items):
+        entered.set()
+        release.wait()
+        return commit(items)
+    monkeypatch.setattr(w, "_commit", blocked)
+
+    assert w.submit(GOOD)
+    assert entered.wait(5)                          # 背景執行緒卡在第一筆
+    assert w.submit(GOOD) and w.submit(GOOD)        # 佇列剛好滿
+    start = time.monotonic()
+    assert not w.submit(GOOD)
+    assert time.monotonic() - start < 0.5
+    assert w.dropped == 1
+
+    release.set()
+    w.flush()
+    assert _count(app) == 3
+    w.close()
@@ -0,0 +1,36 @@
+import card_kernels
+import server
+from board import Board
+from card_engine import CARDS
+from test_card_engine import _position
+
+
+def _room(position):
+    cells, guard, barriers, pid = position
+    room = server.Room("test")
+    room.state["board"] = Board(cells)
+    room.state["effects"]["guard"] = {p: True for p in guard}
+    for b in barriers:
+        room.match._add_barrier(dict(b))
+    room.state["hands"][pid] = [1, 3, 6, 12, 13, 40]
+    return room, pid
+
+
+def test_legal_masks_match_the_engine():
+    room, pid = _room(_position(1))
+    masks = room.legal_masks(pid)["masks"]
+    assert set(masks) == {1, 3, 6}                  # 12 號沒有錨點，13、40 不是形狀牌
+    for cid, by_dir in masks.items():
+        fps = CARDS[cid]["footprints"]
+        assert set(by_dir) == set(fps)
+        for d, hexmask in by_dir.items():
+            assert hexmask == card_kernels.pack(room.match.legal_mask(pid, fps[d]))
+
+
+def test_no_masks_while_blinded():
+    room, pid = _room(_position(2))
+    assert room.legal_masks(pid)["masks"]
+    room.state["effects"]["blind_until"] = room.state["turnCount"] + 6
+    assert room.legal_masks(pid) == {"seq": room.seq, "masks": {}}
+    room.state["turnCount"] += 7                    # 致盲結束後恢復
+    assert room.legal_masks(pid)["masks"]